@@ -1,14 +1,32 @@
+import sqlite3
+
 from flask import Flask
 from config import Config
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from flask_migrate import Migrate
 from flask_login import LoginManager
+from app.sessions import RoutingSQLAlchemy
 
 app = Flask(__name__)
 app.config.from_object(Config)
-db = SQLAlchemy(app)
+db = RoutingSQLAlchemy(app)
 migrate = Migrate(app, db)
 login = LoginManager(app)
 login.login_view = 'login'
 
-from app import routes, models, errors
+
+@event.listens_for(Engine, 'connect')
+def configure_sqlite(dbapi_connection, connection_record):
+    """
+    метод настройки нового соединения с SQLite: режим журнала и синхронизации,
+    время ожидания блокировки задаётся параметром timeout в SQLALCHEMY_ENGINE_OPTIONS
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode={}'.format(app.config['SQLITE_JOURNAL_MODE']))
+    cursor.execute('PRAGMA synchronous={}'.format(app.config['SQLITE_SYNCHRONOUS']))
+    cursor.close()
+
+from app import profiling, replica, uploads, usercache, membership, routes, api, models, errors, cli
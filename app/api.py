@@ -0,0 +1,222 @@
+"""
+модуль api
+
+JSON API для мобильных клиентов по адресам /api/v1/... Ответы содержат
+только id, тексты, время и адреса изображений, данные выбираются теми же
+запросами из модуля queries, что и страницы сайта.
+
+* параметр fields=id,name оставляет у каждого элемента списка только
+  перечисленные поля;
+* каждый ответ получает ETag, и повторный запрос с If-None-Match получает
+  304 без тела;
+* вход выполняется через POST /api/v1/login, дальше работает cookie сессии;
+  запрос без входа получает 401.
+"""
+
+from functools import wraps
+
+from flask import request, jsonify, abort, make_response
+from flask_login import current_user, login_user
+from app import app, membership, queries, realtime
+from app.models import User, Chat
+
+API = '/api/v1'
+
+MAX_LIMIT = 100
+
+
+def error(code, message):
+    """
+    метод прерывания запроса с ошибкой в формате json
+
+    :param code: код ответа
+    :type code: число
+    :param message: описание ошибки
+    :type message: строка
+    """
+    abort(make_response(jsonify(error=message), code))
+
+
+def api_login_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_user.is_authenticated:
+            error(401, 'требуется вход')
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def requested_fields():
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    return {field.strip() for field in fields.split(',') if field.strip()}
+
+
+def select_fields(items, fields):
+    """
+    метод выбора полей у элементов списка
+
+    :param items: элементы
+    :type items: список словарей
+    :param fields: нужные поля или None для всех полей
+    :type fields: множество строк
+    :return: список словарей
+    """
+    if fields is None:
+        return items
+    return [{key: value for key, value in item.items() if key in fields} for item in items]
+
+
+def respond(data):
+    """
+    метод сборки ответа с ETag и проверкой If-None-Match
+
+    :param data: тело ответа
+    :type data: словарь
+    :return: ответ 200 или 304
+    """
+    response = jsonify(data)
+    response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+def user_payload(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'avatar': user.image_url('avatar'),
+    }
+
+
+def chat_payload(chat, unread):
+    partner = chat.interlocutor(current_user)
+    last_post = chat.last_post
+    return {
+        'id': chat.id,
+        'name': chat.name if partner is None else partner.username,
+        'direct': partner is not None,
+        'user': user_payload(partner) if partner is not None else None,
+        'image': chat.image_url('avatar') if partner is None else partner.image_url('avatar'),
+        'unread': unread,
+        'last_activity': chat.last_activity.isoformat() if chat.last_activity else None,
+        'last_post': {'id': last_post.id, 'body': last_post.body,
+                      'timestamp': last_post.timestamp.isoformat()} if last_post else None,
+    }
+
+
+def news_payload(news_item):
+    return {
+        'id': news_item.id,
+        'text': news_item.text,
+        'timestamp': news_item.timestamp.isoformat(),
+        'image': news_item.image_url('news'),
+        'author': user_payload(news_item.author),
+    }
+
+
+@app.route(API + '/login', methods=['POST'])
+def api_login():
+    """
+    метод входа для клиентов API
+
+    :return: пользователь в формате json и cookie сессии
+    """
+    data = request.get_json(silent=True) or {}
+    user = User.query.filter_by(username=data.get('username')).first()
+    if user is None or not user.check_password(data.get('password') or ''):
+        error(401, 'неверное имя пользователя или пароль')
+    login_user(user, remember=bool(data.get('remember')))
+    return jsonify(user_payload(user))
+
+
+@app.route(API + '/chats')
+@api_login_required
+def api_chats():
+    """
+    метод получения чатов пользователя
+
+    :return: список чатов в формате json
+    """
+    items = [chat_payload(chat, unread) for chat, unread in queries.chat_list(current_user)]
+    return respond({'items': select_fields(items, requested_fields())})
+
+
+@app.route(API + '/chats/<int:chat_id>/messages')
+@api_login_required
+def api_messages(chat_id):
+    """
+    метод получения страницы сообщений чата
+
+    Параметры before и after - id сообщения-курсора, limit - размер страницы.
+    В ответе older и newer - курсоры соседних страниц или null.
+
+    :param chat_id: id чата
+    :type chat_id: число
+    :return: сообщения в формате json
+    """
+    if not membership.is_member(current_user, chat_id):
+        error(404, 'чат не найден')
+    chat = Chat.query.get(chat_id)
+    limit = min(max(request.args.get('limit', app.config['MESSAGES_PER_PAGE'], type=int), 1), MAX_LIMIT)
+    posts, has_older, has_newer = queries.chat_history(chat, before=request.args.get('before', type=int),
+                                                       after=request.args.get('after', type=int), limit=limit)
+    items = [realtime.payload_for(post) for post in posts]
+    return respond({
+        'items': select_fields(items, requested_fields()),
+        'older': posts[0].id if posts and has_older else None,
+        'newer': posts[-1].id if posts and has_newer else None,
+    })
+
+
+@app.route(API + '/feed')
+@api_login_required
+def api_feed():
+    """
+    метод получения страницы ленты новостей
+
+    :return: новости в формате json
+    """
+    page = max(request.args.get('page', 1, type=int), 1)
+    news, has_next = queries.feed_news(current_user, page, app.config['NEWS_PER_PAGE'])
+    items = [news_payload(news_item) for news_item in news]
+    return respond({'items': select_fields(items, requested_fields()),
+                    'next_page': page + 1 if has_next else None})
+
+
+@app.route(API + '/users/<username>')
+@api_login_required
+def api_user(username):
+    """
+    метод получения профиля пользователя с последними новостями
+
+    :param username: имя пользователя
+    :type username: строка
+    :return: профиль в формате json
+    """
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        error(404, 'пользователь не найден')
+    profile = dict(user_payload(user), about_me=user.about_me, image=user.image_url('profile'),
+                   last_seen=user.last_seen.isoformat() if user.last_seen else None)
+    fields = requested_fields()
+    if fields is None or 'news' in fields:
+        news = queries.user_news(user, app.config['NEWS_PER_USER_PAGE'])
+        profile['news'] = [news_payload(news_item) for news_item in news]
+    return respond(select_fields([profile], fields)[0])
+
+
+@app.route(API + '/friends')
+@api_login_required
+def api_friends():
+    """
+    метод получения друзей пользователя: подписчиков, подписок и взаимных
+
+    :return: списки пользователей в формате json
+    """
+    friends = current_user.friends()
+    fields = requested_fields()
+    return respond({name: select_fields([user_payload(user) for user in users], fields)
+                    for name, users in (('followers', friends.followers), ('followed', friends.followed),
+                                        ('mutual', friends.mutual))})
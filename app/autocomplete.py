@@ -0,0 +1,136 @@
+"""
+модуль autocomplete
+
+Подсказки имён пользователей по началу имени. Имена держатся в памяти
+процесса в отсортированном списке, поэтому поиск по префиксу - это два
+двоичных поиска без обращения к бд. Список загружается при первом запросе,
+дополняется при регистрации и смене имени, а раз в AUTOCOMPLETE_REFRESH
+секунд фоновый поток перечитывает его целиком, чтобы увидеть изменения из
+других процессов. Новый список собирается вне блокировки и подменяет старый
+целиком, поэтому запросы не ждут перечитывания.
+"""
+
+import threading
+import time
+from bisect import bisect_left, insort
+
+from sqlalchemy import select
+
+from app import app, db
+from app.models import User
+
+
+class UsernameIndex(object):
+    """
+    отсортированный список имён пользователей для поиска по префиксу
+    """
+
+    def __init__(self, refresh):
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self._loading = threading.Lock()
+        self._entries = None
+        self._names = {}
+        self._added = None
+        self._refresher = None
+
+    def _load(self):
+        with self._loading:
+            with self._lock:
+                # имена, добавленные во время чтения, переносятся в новый список
+                self._added = {}
+            try:
+                table = User.__table__
+                with db.engine.connect() as connection:
+                    rows = connection.execute(select([table.c.id, table.c.username])
+                                              .where(table.c.username.isnot(None))).fetchall()
+                names = {user_id: username for user_id, username in rows}
+                entries = sorted((username.lower(), username, user_id) for user_id, username in rows)
+                with self._lock:
+                    for user_id, username in self._added.items():
+                        self._put(entries, names, user_id, username)
+                    self._entries = entries
+                    self._names = names
+            finally:
+                with self._lock:
+                    self._added = None
+
+    @staticmethod
+    def _put(entries, names, user_id, username):
+        old = names.get(user_id)
+        if old is not None:
+            position = bisect_left(entries, (old.lower(), old, user_id))
+            if position < len(entries) and entries[position][2] == user_id:
+                del entries[position]
+        insort(entries, (username.lower(), username, user_id))
+        names[user_id] = username
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh)
+            try:
+                with app.app_context():
+                    self._load()
+            except Exception:
+                app.logger.exception('autocomplete: не удалось перечитать имена пользователей')
+
+    def _ensure_loaded(self):
+        if self._entries is not None:
+            return
+        self._load()
+        with self._lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(target=self._run, name='autocomplete-refresher', daemon=True)
+                self._refresher.start()
+
+    def add(self, user_id, username):
+        """
+        метод добавления пользователя или смены его имени
+
+        :param user_id: id пользователя
+        :type user_id: число
+        :param username: новое имя
+        :type username: строка
+        :return: ничего не возвращает
+        """
+        with self._lock:
+            if self._added is not None:
+                self._added[user_id] = username
+            if self._entries is not None:
+                self._put(self._entries, self._names, user_id, username)
+
+    def complete(self, prefix, limit, preferred=(), exclude=None):
+        """
+        метод поиска имён по началу
+
+        :param prefix: начало имени без учёта регистра
+        :type prefix: строка
+        :param limit: наибольшее количество имён
+        :type limit: число
+        :param preferred: id пользователей, которые идут первыми (например, друзья)
+        :type preferred: множество
+        :param exclude: id пользователя, которого не нужно показывать
+        :type exclude: число
+        :return: список пар (id, имя): сначала предпочтительные, затем остальные по алфавиту
+        """
+        self._ensure_loaded()
+        key = prefix.lower()
+        with self._lock:
+            first = sorted((self._names[user_id].lower(), self._names[user_id], user_id)
+                           for user_id in preferred
+                           if user_id in self._names and self._names[user_id].lower().startswith(key)
+                           and user_id != exclude)[:limit]
+            result = [(user_id, username) for lower, username, user_id in first]
+            taken = {user_id for user_id, username in result}
+            position = bisect_left(self._entries, (key,))
+            while len(result) < limit and position < len(self._entries):
+                lower, username, user_id = self._entries[position]
+                if not lower.startswith(key):
+                    break
+                if user_id not in taken and user_id != exclude:
+                    result.append((user_id, username))
+                position += 1
+        return result
+
+
+index = UsernameIndex(app.config['AUTOCOMPLETE_REFRESH'])
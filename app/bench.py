@@ -0,0 +1,444 @@
+"""
+модуль bench
+
+Нагрузочное тестирование основных страниц. seed() заполняет пустую бд
+синтетическими пользователями, подписками, чатами, сообщениями, новостями,
+комментариями и изображениями, run() прогоняет страницы через тестовый клиент
+Flask или параллельными клиентами по адресу запущенного сервера (например,
+gunicorn) и возвращает отчёт, который можно сохранить в json и сравнить с
+прошлым прогоном.
+"""
+
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from io import BytesIO
+
+import pytz
+from flask import g, request_finished, url_for
+from PIL import Image
+from sqlalchemy import func, select
+from app import app, db
+from app import feed, images, search
+from app.models import User, Chat, Post, News, followers, user_chats
+from app.profiling import percentile
+
+
+PASSWORD = 'bench'
+
+ROUTES = ('index', 'chat', 'news', 'list_of_friends', 'user', 'message')
+
+
+class BenchError(Exception):
+    """
+    ошибка подготовки нагрузочного теста
+    """
+    pass
+
+
+def _picture(rnd):
+    image = Image.new('RGB', (800, 600), tuple(rnd.randrange(256) for _ in range(3)))
+    image.paste(tuple(rnd.randrange(256) for _ in range(3)), (100, 100, rnd.randrange(200, 700), 500))
+    data = BytesIO()
+    image.save(data, 'JPEG')
+    return data.getvalue()
+
+
+def seed(users=200, follows=1000, chats=50, posts=5000, news=1000, comments=3000, pictures=50, rnd=None):
+    """
+    метод заполнения пустой бд синтетическими данными
+
+    Все пользователи получают имена benchN и пароль PASSWORD.
+
+    :param users: количество пользователей
+    :type users: число
+    :param follows: количество подписок
+    :type follows: число
+    :param chats: количество чатов
+    :type chats: число
+    :param posts: количество сообщений в чатах
+    :type posts: число
+    :param news: количество новостей
+    :type news: число
+    :param comments: количество комментариев к новостям
+    :type comments: число
+    :param pictures: количество пользователей и новостей с изображениями
+    :type pictures: число
+    :param rnd: генератор случайных чисел, чтобы данные повторялись между прогонами
+    :type rnd: random.Random
+    :return: словарь с количеством созданных записей
+    """
+    rnd = rnd or random.Random(0)
+    if User.query.count():
+        raise BenchError('бд уже содержит пользователей, нужна пустая бд после flask db upgrade')
+    now = datetime.now(pytz.timezone('Europe/Moscow')).replace(tzinfo=None)
+    start = now - timedelta(days=30)
+
+    def moment():
+        return start + timedelta(seconds=rnd.randrange(30 * 24 * 60 * 60))
+
+    # хэш пароля считается долго, поэтому он общий для всех пользователей
+    sample = User()
+    sample.set_password(PASSWORD)
+    db.session.execute(User.__table__.insert(), [
+        dict(username='bench{}'.format(i), email='bench{}@example.com'.format(i),
+             password_hash=sample.password_hash, about_me='пользователь для нагрузочного теста', last_seen=now)
+        for i in range(users)
+    ])
+    user_ids = [row[0] for row in db.session.execute(select([User.__table__.c.id]).order_by(User.__table__.c.id))]
+
+    pairs = set()
+    for _ in range(min(follows, users * (users - 1))):
+        while True:
+            pair = tuple(rnd.sample(user_ids, 2))
+            if pair not in pairs:
+                pairs.add(pair)
+                break
+    if pairs:
+        db.session.execute(followers.insert(), [dict(follower_id=a, followed_id=b) for a, b in pairs])
+
+    db.session.execute(Chat.__table__.insert(), [dict(name='bench chat {}'.format(i)) for i in range(chats)])
+    chat_ids = [row[0] for row in db.session.execute(select([Chat.__table__.c.id]).order_by(Chat.__table__.c.id))]
+    members = {chat_id: rnd.sample(user_ids, min(len(user_ids), rnd.randint(2, 10))) for chat_id in chat_ids}
+    if members:
+        db.session.execute(user_chats.insert(), [dict(user_id=user_id, chat_id=chat_id, unread=0)
+                                                 for chat_id, chat_users in members.items()
+                                                 for user_id in chat_users])
+    chat_posts = []
+    for i in range(posts if chat_ids else 0):
+        chat_id = rnd.choice(chat_ids)
+        chat_posts.append(dict(body='сообщение {}'.format(i), timestamp=moment(),
+                               user_id=rnd.choice(members[chat_id]), chat_id=chat_id))
+    chat_posts.sort(key=lambda row: row['timestamp'])
+    if chat_posts:
+        db.session.execute(Post.__table__.insert(), chat_posts)
+    post, chat = Post.__table__, Chat.__table__
+    last = db.session.execute(select([post.c.chat_id, func.max(post.c.id), func.max(post.c.timestamp)])
+                              .where(post.c.chat_id.isnot(None)).group_by(post.c.chat_id)).fetchall()
+    for chat_id, post_id, timestamp in last:
+        db.session.execute(chat.update().where(chat.c.id == chat_id)
+                           .values(last_post_id=post_id, last_activity=timestamp))
+
+    db.session.execute(News.__table__.insert(), sorted([
+        dict(text='новость {}'.format(i), timestamp=moment(), user_id=rnd.choice(user_ids)) for i in range(news)
+    ], key=lambda row: row['timestamp']))
+    news_rows = db.session.execute(select([News.__table__.c.id, News.__table__.c.timestamp])).fetchall()
+    if news_rows:
+        db.session.execute(Post.__table__.insert(), [
+            dict(body='комментарий {}'.format(i), user_id=rnd.choice(user_ids), news_id=news_id,
+                 timestamp=timestamp + timedelta(minutes=rnd.randrange(1, 600)))
+            for i, (news_id, timestamp) in ((i, rnd.choice(news_rows)) for i in range(comments))
+        ])
+    db.session.commit()
+
+    # несколько разных картинок на всех, чтобы не пережимать каждую заново
+    datas = [_picture(rnd) for _ in range(min(pictures, 8))]
+    entities = User.query.order_by(User.id).limit(pictures // 2).all() + \
+        News.query.order_by(News.id).limit(pictures - pictures // 2).all()
+    for i, entity in enumerate(entities):
+        images.attach(entity, datas[i % len(datas)])
+    db.session.commit()
+
+    feed_items = feed.backfill()
+    # массовые вставки выше минуют обновление индекса при flush
+    search.rebuild()
+    return {'users': len(user_ids), 'follows': len(pairs), 'chats': len(chat_ids), 'posts': len(chat_posts),
+            'news': len(news_rows), 'comments': comments if news_rows else 0, 'pictures': len(entities),
+            'feed_items': feed_items}
+
+
+def plan(count, routes=ROUTES, rnd=None):
+    """
+    метод составления списка посещений для прогона
+
+    Каждое посещение - случайный участник случайного чата, который проходит
+    по всем выбранным страницам.
+
+    :param count: количество посещений
+    :type count: число
+    :param routes: страницы из ROUTES
+    :type routes: список строк
+    :param rnd: генератор случайных чисел
+    :type rnd: random.Random
+    :return: список пар (пользователь, список (страница, метод, адрес))
+    """
+    rnd = rnd or random.Random(0)
+    user = User.__table__
+    memberships = db.session.execute(select([user.c.id, user.c.username, user_chats.c.chat_id])
+                                     .select_from(user.join(user_chats, user_chats.c.user_id == user.c.id))
+                                     .order_by(user_chats.c.chat_id, user.c.id)).fetchall()
+    usernames = [row[0] for row in db.session.execute(select([user.c.username]).order_by(user.c.id))]
+    if not memberships:
+        raise BenchError('в бд нет участников чатов, сначала выполните flask bench seed')
+    visits = []
+    with app.test_request_context():
+        for _ in range(count):
+            user_id, username, chat_id = rnd.choice(memberships)
+            urls = {
+                'index': ('GET', url_for('index')),
+                'chat': ('GET', url_for('chat', chat_id=chat_id)),
+                'news': ('GET', url_for('news')),
+                'list_of_friends': ('GET', url_for('list_of_friends')),
+                'user': ('GET', url_for('user', username=rnd.choice(usernames))),
+                'message': ('POST', url_for('message', chat_id=chat_id)),
+            }
+            visits.append(((user_id, username), [(route,) + urls[route] for route in routes]))
+    return visits
+
+
+def _run_local(visits):
+    """
+    метод прогона посещений через тестовый клиент Flask
+
+    :return: список замеров (страница, секунды, код ответа, количество запросов к бд)
+    """
+    samples, counts = [], []
+
+    def remember_count(sender, response, **extra):
+        counts.append(g.get('query_count'))
+
+    with request_finished.connected_to(remember_count, app):
+        for (user_id, username), pages in visits:
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['_user_id'] = str(user_id)
+                session['_fresh'] = True
+            for route, method, url in pages:
+                del counts[:]
+                started = time.perf_counter()
+                if method == 'POST':
+                    response = client.post(url, data={'text': 'нагрузочный тест'},
+                                           headers={'Accept': 'application/json'})
+                else:
+                    response = client.get(url)
+                elapsed = time.perf_counter() - started
+                samples.append((route, elapsed, response.status_code, counts[-1] if counts else None))
+    return samples
+
+
+def _login(session, base_url, username):
+    page = session.get(base_url + '/login')
+    token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page.text)
+    response = session.post(base_url + '/login', data={
+        'username': username, 'password': PASSWORD, 'csrf_token': token.group(1) if token else '',
+    }, allow_redirects=False)
+    if response.status_code != 302:
+        raise BenchError('не удалось войти как {}'.format(username))
+
+
+def _run_remote(visits, base_url, concurrency):
+    """
+    метод прогона посещений параллельными клиентами по адресу сервера
+
+    Сервер должен работать с той же бд, для которой составлены посещения.
+    Количество запросов к бд известно, только если сервер отдаёт X-Query-Count.
+
+    :return: список замеров (страница, секунды, код ответа, количество запросов к бд)
+    """
+    import requests
+
+    base_url = base_url.rstrip('/')
+    samples, lock = [], threading.Lock()
+    pending = list(reversed(visits))
+
+    def worker():
+        sessions = {}
+        while True:
+            with lock:
+                if not pending:
+                    return
+                (user_id, username), pages = pending.pop()
+            if username not in sessions:
+                sessions[username] = requests.Session()
+                _login(sessions[username], base_url, username)
+            session = sessions[username]
+            for route, method, url in pages:
+                started = time.perf_counter()
+                if method == 'POST':
+                    response = session.post(base_url + url, data={'text': 'нагрузочный тест'},
+                                            headers={'Accept': 'application/json'}, allow_redirects=False)
+                else:
+                    response = session.get(base_url + url, allow_redirects=False)
+                elapsed = time.perf_counter() - started
+                count = response.headers.get('X-Query-Count')
+                with lock:
+                    samples.append((route, elapsed, response.status_code, int(count) if count else None))
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def _summary(samples, duration):
+    latencies = sorted(elapsed for route, elapsed, status, count in samples)
+    counts = [count for route, elapsed, status, count in samples if count is not None]
+    summary = {
+        'requests': len(samples),
+        'errors': sum(1 for route, elapsed, status, count in samples if status >= 400),
+        'mean_ms': round(sum(latencies) * 1000 / len(latencies), 2) if latencies else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else None,
+        'queries_avg': round(sum(counts) / len(counts), 2) if counts else None,
+        'queries_max': max(counts) if counts else None,
+    }
+    if duration:
+        summary['throughput_rps'] = round(len(samples) / duration, 2)
+    return summary
+
+
+def run(count=100, routes=ROUTES, url=None, concurrency=1, warmup=5, rnd=None):
+    """
+    метод нагрузочного прогона страниц
+
+    :param count: количество посещений, каждое проходит по всем страницам
+    :type count: число
+    :param routes: страницы из ROUTES
+    :type routes: список строк
+    :param url: адрес запущенного сервера; без него используется тестовый клиент
+    :type url: строка
+    :param concurrency: количество параллельных клиентов при прогоне по адресу
+    :type concurrency: число
+    :param warmup: количество посещений перед замерами, которые не попадают в отчёт
+    :type warmup: число
+    :param rnd: генератор случайных чисел
+    :type rnd: random.Random
+    :return: отчёт в виде словаря, пригодного для json
+    """
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        raise BenchError('неизвестные страницы: {}'.format(', '.join(sorted(unknown))))
+    visits = plan(warmup + count, routes, rnd)
+    db.session.remove()
+
+    def execute(part):
+        if url:
+            return _run_remote(part, url, concurrency)
+        return _run_local(part)
+
+    execute(visits[:warmup])
+    started = time.perf_counter()
+    samples = execute(visits[warmup:])
+    duration = time.perf_counter() - started
+    return {
+        'meta': {
+            'started': datetime.utcnow().isoformat() + 'Z',
+            'target': url or 'test client',
+            'database': db.engine.url.drivername if not url else None,
+            'concurrency': concurrency if url else 1,
+            'visits': count,
+            'duration_s': round(duration, 3),
+        },
+        'total': _summary(samples, duration),
+        'routes': {route: _summary([sample for sample in samples if sample[0] == route], None)
+                   for route in routes},
+    }
+
+
+def writes(writers=8, count=50, readers=4, rnd=None):
+    """
+    метод прогона одновременной записи сообщений через тестовый клиент
+
+    Писатели отправляют сообщения в свои чаты, читатели в это время
+    открывают страницы чатов. Показывает, как настройки движка бд
+    (журнал SQLite, ожидание блокировки, пул) держат конкурентную запись.
+
+    :param writers: количество потоков-писателей
+    :type writers: число
+    :param count: количество сообщений от каждого писателя
+    :type count: число
+    :param readers: количество потоков-читателей
+    :type readers: число
+    :param rnd: генератор случайных чисел
+    :type rnd: random.Random
+    :return: отчёт в виде словаря, пригодного для json
+    """
+    rnd = rnd or random.Random(0)
+    memberships = db.session.execute(select([user_chats.c.user_id, user_chats.c.chat_id])).fetchall()
+    if not memberships:
+        raise BenchError('в бд нет участников чатов, сначала выполните flask bench seed')
+    db.session.remove()
+    with app.test_request_context():
+        targets = [(user_id, url_for('message', chat_id=chat_id), url_for('chat', chat_id=chat_id))
+                   for user_id, chat_id in (rnd.choice(memberships) for _ in range(writers + readers))]
+    samples, lock, done = [], threading.Lock(), threading.Event()
+
+    def client_for(user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+
+    def measure(route, send):
+        started = time.perf_counter()
+        status = send().status_code
+        with lock:
+            samples.append((route, time.perf_counter() - started, status, None))
+
+    def writer(user_id, message_url, chat_url):
+        client = client_for(user_id)
+        for i in range(count):
+            measure('message', lambda: client.post(message_url, data={'text': 'запись {}'.format(i)},
+                                                   headers={'Accept': 'application/json'}))
+
+    def reader(user_id, message_url, chat_url):
+        client = client_for(user_id)
+        while not done.is_set():
+            measure('chat', lambda: client.get(chat_url))
+
+    threads = [threading.Thread(target=writer, args=target) for target in targets[:writers]]
+    background = [threading.Thread(target=reader, args=target) for target in targets[writers:]]
+    started = time.perf_counter()
+    for thread in threads + background:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+    done.set()
+    for thread in background:
+        thread.join()
+    options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+    return {
+        'meta': {
+            'started': datetime.utcnow().isoformat() + 'Z',
+            'database': db.engine.url.drivername,
+            'journal_mode': app.config['SQLITE_JOURNAL_MODE'] if db.engine.url.drivername == 'sqlite' else None,
+            'synchronous': app.config['SQLITE_SYNCHRONOUS'] if db.engine.url.drivername == 'sqlite' else None,
+            'pool_size': options.get('pool_size'),
+            'writers': writers,
+            'readers': readers,
+            'duration_s': round(duration, 3),
+        },
+        'routes': {route: _summary([sample for sample in samples if sample[0] == route], duration)
+                   for route in ('message', 'chat')},
+    }
+
+
+def compare(baseline, current):
+    """
+    метод сравнения двух отчётов
+
+    :param baseline: прошлый отчёт
+    :type baseline: словарь
+    :param current: новый отчёт
+    :type current: словарь
+    :return: словарь страница -> показатель -> (было, стало, изменение в процентах)
+    """
+    result = {}
+    for route in ['total'] + sorted(set(baseline['routes']) & set(current['routes'])):
+        old = baseline['total'] if route == 'total' else baseline['routes'][route]
+        new = current['total'] if route == 'total' else current['routes'][route]
+        result[route] = {}
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'queries_avg'):
+            if old.get(key) is None or new.get(key) is None:
+                continue
+            change = round((new[key] - old[key]) * 100.0 / old[key], 1) if old[key] else None
+            result[route][key] = (old[key], new[key], change)
+    return result
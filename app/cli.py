@@ -0,0 +1,170 @@
+"""
+модуль cli
+"""
+
+import json
+import random
+
+import click
+from app import app
+from app import bench as load_test
+from app import feed as news_feed
+from app import images as image_sizes
+from app import search as search_index
+from app import replica as read_replica
+from app import jobs as background_jobs
+
+
+@app.cli.group()
+def feed():
+    """Команды обслуживания ленты новостей."""
+    pass
+
+
+@feed.command()
+def backfill():
+    """Пересобрать ленты новостей всех пользователей."""
+    count = news_feed.backfill()
+    click.echo('В ленты записано новостей: {}'.format(count))
+
+
+@app.cli.group()
+def images():
+    """Команды обслуживания изображений."""
+    pass
+
+
+@images.command()
+def rebuild():
+    """Подготовить размеры для изображений, загруженных раньше."""
+    done, failed = image_sizes.rebuild()
+    click.echo('Обработано изображений: {}, с ошибками: {}'.format(done, failed))
+
+
+@app.cli.group()
+def search():
+    """Команды обслуживания поиска."""
+    pass
+
+
+@search.command('rebuild')
+def search_rebuild():
+    """Пересобрать таблицы полнотекстового поиска."""
+    count = search_index.rebuild()
+    if count is None:
+        click.echo('Бд не поддерживает FTS5, поиск работает без индекса')
+    else:
+        click.echo('Проиндексировано объектов: {}'.format(count))
+
+
+@app.cli.group()
+def replica():
+    """Команды работы с репликой бд."""
+    pass
+
+
+@replica.command('sync')
+def replica_sync():
+    """Скопировать основную бд SQLite в файл реплики."""
+    try:
+        path = read_replica.sync()
+    except read_replica.ReplicaError as e:
+        raise click.ClickException(str(e))
+    click.echo('Реплика обновлена: {}'.format(path))
+
+
+@app.cli.group()
+def jobs():
+    """Команды работы с фоновыми задачами."""
+    pass
+
+
+@jobs.command('work')
+@click.option('--once', is_flag=True, help='Выйти, когда готовых задач не останется.')
+@click.option('--stale', default=0, help='Сначала вернуть в очередь задачи, которые числятся '
+                                          'выполняемыми дольше этого количества секунд.')
+def jobs_work(once, stale):
+    """Выполнять задачи из таблицы job."""
+    if stale:
+        click.echo('Возвращено в очередь: {}'.format(background_jobs.requeue_stale(stale)))
+    count = background_jobs.work(once)
+    click.echo('Выполнено попыток: {}'.format(count))
+
+
+@jobs.command('status')
+def jobs_status():
+    """Показать количество задач по состояниям."""
+    for status, count in sorted(background_jobs.counts().items()):
+        click.echo('{}: {}'.format(status, count))
+
+
+@app.cli.group()
+def bench():
+    """Нагрузочное тестирование основных страниц."""
+    pass
+
+
+@bench.command('seed')
+@click.option('--users', default=200, help='Количество пользователей.')
+@click.option('--follows', default=1000, help='Количество подписок.')
+@click.option('--chats', default=50, help='Количество чатов.')
+@click.option('--posts', default=5000, help='Количество сообщений в чатах.')
+@click.option('--news', default=1000, help='Количество новостей.')
+@click.option('--comments', default=3000, help='Количество комментариев к новостям.')
+@click.option('--pictures', default=50, help='Количество пользователей и новостей с изображениями.')
+@click.option('--seed', 'seed_value', default=0, help='Начальное значение генератора случайных чисел.')
+def bench_seed(users, follows, chats, posts, news, comments, pictures, seed_value):
+    """Заполнить пустую бд синтетическими данными."""
+    try:
+        counts = load_test.seed(users, follows, chats, posts, news, comments, pictures,
+                                random.Random(seed_value))
+    except load_test.BenchError as e:
+        raise click.ClickException(str(e))
+    click.echo(', '.join('{}: {}'.format(name, count) for name, count in counts.items()))
+
+
+@bench.command('run')
+@click.option('--visits', default=100, help='Количество посещений, каждое проходит по всем страницам.')
+@click.option('--routes', default=','.join(load_test.ROUTES), help='Страницы через запятую.')
+@click.option('--url', default=None, help='Адрес запущенного сервера вместо тестового клиента.')
+@click.option('--concurrency', default=1, help='Количество параллельных клиентов при прогоне по адресу.')
+@click.option('--warmup', default=5, help='Количество посещений перед замерами.')
+@click.option('--seed', 'seed_value', default=0, help='Начальное значение генератора случайных чисел.')
+@click.option('--output', type=click.File('w'), default='-', help='Файл для отчёта в json.')
+def bench_run(visits, routes, url, concurrency, warmup, seed_value, output):
+    """Прогнать страницы и записать отчёт о задержках."""
+    try:
+        report = load_test.run(visits, [route for route in routes.split(',') if route], url, concurrency, warmup,
+                               random.Random(seed_value))
+    except load_test.BenchError as e:
+        raise click.ClickException(str(e))
+    json.dump(report, output, indent=2, ensure_ascii=False)
+    output.write('\n')
+
+
+@bench.command('writes')
+@click.option('--writers', default=8, help='Количество потоков-писателей.')
+@click.option('--count', default=50, help='Количество сообщений от каждого писателя.')
+@click.option('--readers', default=4, help='Количество потоков-читателей.')
+@click.option('--seed', 'seed_value', default=0, help='Начальное значение генератора случайных чисел.')
+@click.option('--output', type=click.File('w'), default='-', help='Файл для отчёта в json.')
+def bench_writes(writers, count, readers, seed_value, output):
+    """Прогнать одновременную запись сообщений и записать отчёт."""
+    try:
+        report = load_test.writes(writers, count, readers, random.Random(seed_value))
+    except load_test.BenchError as e:
+        raise click.ClickException(str(e))
+    json.dump(report, output, indent=2, ensure_ascii=False)
+    output.write('\n')
+
+
+@bench.command('compare')
+@click.argument('baseline', type=click.File())
+@click.argument('current', type=click.File())
+def bench_compare(baseline, current):
+    """Сравнить два отчёта flask bench run."""
+    for route, values in load_test.compare(json.load(baseline), json.load(current)).items():
+        click.echo(route)
+        for key, (old, new, change) in values.items():
+            click.echo('  {:<15} {:>10} -> {:<10} {}'.format(
+                key, old, new, '' if change is None else '{:+.1f}%'.format(change)))
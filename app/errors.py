@@ -1,5 +1,5 @@
-from flask import render_template
-from app import app, db
+from flask import render_template, flash, redirect, request, url_for, jsonify
+from app import app, db, api
 
 
 @app.errorhandler(404)
@@ -7,6 +7,17 @@ def not_found_error(error):
     return render_template('404.html'), 404
 
 
+@app.errorhandler(413)
+def too_large_error(error):
+    message = 'Файл слишком большой, выберите файл меньше.'
+    # api и запросы из скриптов получают ошибку в json, формы - сообщение и возврат на страницу
+    if request.path.startswith(api.API + '/') or request.headers.get('X-Requested-With') == 'XMLHttpRequest' \
+            or request.accept_mimetypes.best == 'application/json':
+        return jsonify(error=message), 413
+    flash(message)
+    return redirect(request.referrer or url_for('index'))
+
+
 @app.errorhandler(500)
 def internal_error(error):
     db.session.rollback()
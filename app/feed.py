@@ -0,0 +1,115 @@
+"""
+модуль feed
+
+Материализованная лента новостей. Новость раскладывается в ленты друзей автора
+фоновой задачей после публикации, поэтому страница новостей читает одну ленту
+по индексу, а публикация не зависит от количества друзей.
+"""
+
+from sqlalchemy import and_, or_, union, select, literal
+from app import db, jobs
+from app.models import FeedItem, News, followers
+
+
+feed_table = FeedItem.__table__
+news_table = News.__table__
+
+
+def friend_ids(user_id):
+    """
+    метод получения id друзей пользователя (подписчиков и подписок)
+
+    :param user_id: id пользователя
+    :type user_id: число
+    :return: множество id друзей
+    """
+    query = union(
+        select([followers.c.followed_id]).where(followers.c.follower_id == user_id),
+        select([followers.c.follower_id]).where(followers.c.followed_id == user_id),
+    )
+    return {row[0] for row in db.session.execute(query)}
+
+
+def fan_out(news):
+    """
+    метод добавления новости в ленты всех друзей автора, в которых её ещё нет
+
+    :param news: опубликованная новость
+    :type news: новость
+    :return: ничего не возвращает
+    """
+    readers = friend_ids(news.user_id)
+    readers.difference_update(row[0] for row in db.session.execute(
+        select([feed_table.c.user_id]).where(feed_table.c.news_id == news.id)))
+    if not readers:
+        return
+    db.session.execute(feed_table.insert(), [
+        dict(user_id=reader_id, author_id=news.user_id, news_id=news.id, timestamp=news.timestamp)
+        for reader_id in readers
+    ])
+
+
+@jobs.task('feed.fan_out')
+def fan_out_job(news_id):
+    news = News.query.get(news_id)
+    if news is not None:
+        fan_out(news)
+
+
+def _push_author(reader_id, author_id):
+    db.session.execute(feed_table.delete().where(and_(feed_table.c.user_id == reader_id,
+                                                      feed_table.c.author_id == author_id)))
+    db.session.execute(feed_table.insert().from_select(
+        ['user_id', 'author_id', 'news_id', 'timestamp'],
+        select([literal(reader_id), news_table.c.user_id, news_table.c.id, news_table.c.timestamp])
+        .where(news_table.c.user_id == author_id)))
+
+
+def link(user, friend):
+    """
+    метод заполнения лент двух пользователей новостями друг друга после добавления в друзья
+
+    :param user: пользователь
+    :type user: пользователь
+    :param friend: новый друг
+    :type friend: пользователь
+    :return: ничего не возвращает
+    """
+    _push_author(user.id, friend.id)
+    _push_author(friend.id, user.id)
+
+
+def unlink(user, friend):
+    """
+    метод очистки лент двух пользователей, если они больше не друзья
+
+    :param user: пользователь
+    :type user: пользователь
+    :param friend: бывший друг
+    :type friend: пользователь
+    :return: ничего не возвращает
+    """
+    if user.is_following(friend) or friend.is_following(user):
+        return
+    db.session.execute(feed_table.delete().where(or_(
+        and_(feed_table.c.user_id == user.id, feed_table.c.author_id == friend.id),
+        and_(feed_table.c.user_id == friend.id, feed_table.c.author_id == user.id))))
+
+
+def backfill():
+    """
+    метод полной пересборки лент всех пользователей по таблицам followers и news
+
+    :return: количество строк в лентах
+    """
+    db.session.execute(feed_table.delete())
+    as_follower = select([followers.c.follower_id, news_table.c.user_id, news_table.c.id,
+                          news_table.c.timestamp]) \
+        .select_from(followers.join(news_table, news_table.c.user_id == followers.c.followed_id))
+    as_followed = select([followers.c.followed_id, news_table.c.user_id, news_table.c.id,
+                          news_table.c.timestamp]) \
+        .select_from(followers.join(news_table, news_table.c.user_id == followers.c.follower_id))
+    db.session.execute(feed_table.insert().from_select(
+        ['user_id', 'author_id', 'news_id', 'timestamp'], union(as_follower, as_followed)))
+    db.session.commit()
+    return db.session.query(FeedItem).count()
@@ -108,6 +108,22 @@ class SearchUserForm(FlaskForm):
     submit = SubmitField('Подтвердить')
 
 
+class InviteUsersForm(FlaskForm):
+    """
+    форма приглашения пользователей в чат
+    """
+    username = StringField('Имена пользователей через запятую', validators=[DataRequired()])
+    submit = SubmitField('Пригласить')
+
+
+class InvitationsForm(FlaskForm):
+    """
+    форма ответа на несколько приглашений
+    """
+    accept = SubmitField('Принять выбранные')
+    decline = SubmitField('Отклонить выбранные')
+
+
 class PostForm(FlaskForm):
     """
     форма написания сообщения
@@ -0,0 +1,216 @@
+"""
+модуль fragments
+
+Кэш готовых кусков html. Блок новости на странице профиля и в ленте
+одинаков для всех читателей, поэтому он рендерится один раз и хранится по
+ключу (шаблон, id новости, версия новости). Версия увеличивается при
+комментарии, смене изображения новости, а также при смене имени или аватара
+автора и комментаторов, так что устаревший блок просто перестаёт запрашиваться.
+
+Хранилище выбирается настройкой FRAGMENT_CACHE:
+
+* memory - LRU в памяти процесса на FRAGMENT_CACHE_SIZE блоков;
+* filesystem - файлы в FRAGMENT_CACHE_PATH, общие для всех процессов на машине;
+* none - без кэша.
+"""
+
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from hashlib import sha1
+
+from flask import render_template
+from markupsafe import Markup
+from app import app
+
+
+class FragmentCache(ABC):
+    """
+    базовый класс кэша блоков
+    """
+
+    @abstractmethod
+    def get(self, key):
+        """
+        метод получения блока
+
+        :param key: ключ
+        :type key: строка
+        :return: html блока или None
+        """
+
+    @abstractmethod
+    def set(self, key, value):
+        """
+        метод сохранения блока
+
+        :param key: ключ
+        :type key: строка
+        :param value: html блока
+        :type value: строка
+        :return: ничего не возвращает
+        """
+
+    @abstractmethod
+    def clear(self):
+        """
+        метод удаления всех блоков
+
+        :return: ничего не возвращает
+        """
+
+
+class NullFragmentCache(FragmentCache):
+    """
+    кэш, который ничего не хранит
+    """
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryFragmentCache(FragmentCache):
+    """
+    LRU в памяти процесса с ограничением на количество блоков
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class FileSystemFragmentCache(FragmentCache):
+    """
+    кэш в каталоге на диске: файл <root>/ab/abcd... на каждый ключ
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key):
+        name = sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, name[:2], name)
+
+    def get(self, key):
+        try:
+            with open(self.path(key), encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, value):
+        path = self.path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as tmp:
+                tmp.write(value)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def clear(self):
+        for directory, subdirectories, files in os.walk(self.root):
+            for name in files:
+                os.unlink(os.path.join(directory, name))
+
+
+BACKENDS = {
+    'memory': lambda config: MemoryFragmentCache(config['FRAGMENT_CACHE_SIZE']),
+    'filesystem': lambda config: FileSystemFragmentCache(config['FRAGMENT_CACHE_PATH']),
+    'none': lambda config: NullFragmentCache(),
+}
+
+
+def create_cache(config):
+    """
+    метод создания кэша по настройкам приложения
+
+    :param config: настройки приложения
+    :type config: словарь
+    :return: кэш блоков
+    """
+    return BACKENDS[config['FRAGMENT_CACHE']](config)
+
+
+cache = create_cache(app.config)
+
+_template_stamps = {}
+
+
+def template_stamp(name):
+    """
+    метод получения отметки версии шаблона: времени изменения его файла
+
+    Отметка входит в ключи блоков и ETag страниц, чтобы правка шаблона сбрасывала их.
+
+    :param name: имя шаблона
+    :type name: строка
+    :return: строка
+    """
+    stamp = _template_stamps.get(name)
+    if stamp is None:
+        filename = app.jinja_env.get_template(name).filename
+        stamp = _template_stamps[name] = str(int(os.path.getmtime(filename))) if filename else '0'
+    return stamp
+
+
+def news_blocks(template, news, comments_loader):
+    """
+    метод получения готовых блоков новостей
+
+    Комментарии загружаются и блоки рендерятся только для новостей,
+    которых нет в кэше.
+
+    :param template: шаблон блока, получает news_item и comments
+    :type template: строка
+    :param news: новости
+    :type news: список новостей
+    :param comments_loader: метод загрузки комментариев, например queries.comments_for
+    :type comments_loader: метод
+    :return: список html блоков в порядке новостей
+    """
+    stamp = template_stamp(template)
+    keys = ['{}:{}:{}:{}'.format(template, stamp, news_item.id, news_item.version) for news_item in news]
+    blocks = [cache.get(key) for key in keys]
+    missing = [news_item for news_item, block in zip(news, blocks) if block is None]
+    if missing:
+        comments = comments_loader(missing)
+        rendered = {}
+        for news_item in missing:
+            rendered[news_item.id] = render_template(template, news_item=news_item,
+                                                     comments=comments[news_item.id])
+        for i, (key, news_item) in enumerate(zip(keys, news)):
+            if blocks[i] is None:
+                blocks[i] = rendered[news_item.id]
+                cache.set(key, blocks[i])
+    return [Markup(block) for block in blocks]
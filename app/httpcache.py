@@ -0,0 +1,152 @@
+"""
+модуль httpcache
+
+HTTP-кэширование страниц и статических файлов.
+
+Для страниц профиля и ленты ETag собирается из дешёвых отметок: полей
+пользователя, пар (id, версия) новостей на странице и времени изменения
+шаблонов. Версия новости растёт при комментарии, смене изображения и смене
+имени или аватара автора и комментаторов, поэтому совпадение ETag означает
+ту же страницу, и ответ 304 отдаётся до выборки комментариев и рендеринга.
+Ждущие в сессии flash-сообщения тоже входят в ETag, поэтому новое сообщение
+не теряется за ответом 304.
+
+Статические файлы подключаются через static_url(): адрес содержит отпечаток
+содержимого, поэтому такой ответ кэшируется на STATIC_CACHE_MAX_AGE секунд,
+а изменённый файл получает новый адрес. Ответ на адрес с устаревшим или
+чужим отпечатком содержит текущий файл и кэшируется только с проверкой.
+"""
+
+import os
+from hashlib import md5, sha1
+
+from flask import request, session, make_response, url_for
+from flask_login import current_user
+from app import app, fragments
+
+PAGE_CACHE_CONTROL = 'private, no-cache'
+
+
+def page_etag(templates, *parts):
+    """
+    метод вычисления ETag страницы
+
+    :param templates: шаблоны, из которых строится страница
+    :type templates: список строк
+    :param parts: значения, от которых зависит содержимое страницы
+    :return: ETag
+    """
+    viewer = (current_user.id, current_user.username, current_user.image_hash) \
+        if current_user.is_authenticated else None
+    stamps = [fragments.template_stamp(name) for name in templates] + [static_stamp()]
+    flashes = session.get('_flashes')
+    return sha1(repr((stamps, viewer, flashes, parts)).encode('utf-8')).hexdigest()
+
+
+_static_stamp = {}
+
+
+def static_stamp():
+    """
+    метод получения отметки версии статических файлов: наибольшего времени изменения
+
+    Адреса статических файлов в странице содержат отпечатки, поэтому их смена меняет страницу.
+    Отметка вычисляется один раз, а в режиме отладки - заново при изменении папки app/static.
+
+    :return: число
+    """
+    key = os.path.getmtime(app.static_folder) if app.debug else None
+    if key in _static_stamp:
+        return _static_stamp[key]
+    stamp = 0
+    for directory, subdirectories, files in os.walk(app.static_folder):
+        for name in files:
+            stamp = max(stamp, os.path.getmtime(os.path.join(directory, name)))
+    _static_stamp.clear()
+    _static_stamp[key] = stamp
+    return stamp
+
+
+def not_modified(etag):
+    """
+    метод проверки If-None-Match запроса
+
+    :param etag: ETag текущей версии страницы
+    :type etag: строка
+    :return: ответ 304 или None, если страницу нужно построить
+    """
+    if etag not in request.if_none_match:
+        return None
+    response = make_response('', 304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = PAGE_CACHE_CONTROL
+    return response
+
+
+def with_etag(page, etag):
+    """
+    метод сборки ответа страницы с ETag
+
+    :param page: html страницы
+    :type page: строка
+    :param etag: ETag страницы
+    :type etag: строка
+    :return: ответ
+    """
+    response = make_response(page)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = PAGE_CACHE_CONTROL
+    return response
+
+
+_fingerprints = {}
+
+
+def fingerprint(filename):
+    """
+    метод получения отпечатка содержимого статического файла
+
+    :param filename: путь файла внутри app/static
+    :type filename: строка
+    :return: первые символы md5 содержимого или None, если файла нет
+    """
+    path = os.path.join(app.static_folder, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _fingerprints.get(filename)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as f:
+        value = md5(f.read()).hexdigest()[:12]
+    _fingerprints[filename] = (mtime, value)
+    return value
+
+
+@app.template_global()
+def static_url(filename):
+    """
+    метод получения адреса статического файла с отпечатком содержимого
+
+    :param filename: путь файла внутри app/static
+    :type filename: строка
+    :return: адрес
+    """
+    version = fingerprint(filename)
+    if version is None:
+        return url_for('static', filename=filename)
+    return url_for('static', filename=filename, v=version)
+
+
+@app.after_request
+def cache_static(response):
+    if request.endpoint == 'static' and 'v' in request.args and response.status_code in (200, 304):
+        if request.args['v'] == fingerprint(request.view_args['filename']):
+            response.cache_control.public = True
+            response.cache_control.max_age = app.config['STATIC_CACHE_MAX_AGE']
+            response.headers['Cache-Control'] += ', immutable'
+        else:
+            response.cache_control.max_age = 0
+            response.cache_control.no_cache = True
+    return response
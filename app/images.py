@@ -0,0 +1,214 @@
+"""
+модуль images
+
+Загруженное изображение один раз проверяется, декодируется и пережимается в набор
+размеров, которые затем отдаются страницам вместо исходного файла. Запрос загрузки
+только сохраняет исходный файл в хранилище, а размеры готовит фоновая задача
+images.attach, после которой объект получает новое изображение.
+"""
+
+from hashlib import sha256
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from app import app, db, jobs
+from app.models import ImageVariant, User, Chat, News
+from app.storage import store
+
+
+_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+)
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP', 'BMP'}
+
+# размер -> (ширина, высота); нулевая высота не ограничивается
+SIZES = {
+    'avatar': (36, 36),
+    'profile': (256, 256),
+    'news': (600, 0),
+}
+
+# размеры, которые обрезаются до квадрата, а не вписываются в рамку
+CROPPED_SIZES = {'avatar'}
+
+MODELS = {'user': User, 'chat': Chat, 'news': News}
+
+
+class ImageError(ValueError):
+    """
+    ошибка разбора загруженного изображения
+    """
+    pass
+
+
+def digest(data):
+    """
+    метод вычисления хэша содержимого изображения
+
+    :param data: содержимое изображения
+    :type data: байты
+    :return: sha256 в шестнадцатеричном виде
+    """
+    return sha256(data).hexdigest()
+
+
+def guess_mimetype(data):
+    """
+    метод определения типа изображения по первым байтам
+
+    :param data: содержимое изображения
+    :type data: байты
+    :return: mime-тип изображения
+    """
+    head = bytes(data[:12])
+    for signature, mimetype in _SIGNATURES:
+        if head.startswith(signature):
+            return mimetype
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'application/octet-stream'
+
+
+def _decode(data):
+    Image.MAX_IMAGE_PIXELS = app.config['IMAGE_MAX_PIXELS']
+    try:
+        image = Image.open(BytesIO(data))
+        image_format = image.format
+        image.load()
+    except (IOError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageError('не удалось прочитать изображение: {}'.format(e))
+    if image_format not in ALLOWED_FORMATS:
+        raise ImageError('неподдерживаемый формат изображения: {}'.format(image_format))
+    return ImageOps.exif_transpose(image)
+
+
+def _render(image, size):
+    width, height = SIZES[size]
+    if size in CROPPED_SIZES:
+        return ImageOps.fit(image, (width, height), Image.LANCZOS)
+    variant = image.copy()
+    variant.thumbnail((width, height or variant.height), Image.LANCZOS)
+    return variant
+
+
+def _encode(image):
+    output = BytesIO()
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image.convert('RGBA').save(output, 'PNG', optimize=True)
+        return 'image/png', output.getvalue()
+    image.convert('RGB').save(output, 'JPEG', quality=app.config['IMAGE_JPEG_QUALITY'], optimize=True)
+    return 'image/jpeg', output.getvalue()
+
+
+def render_sizes(data):
+    """
+    метод подготовки всех размеров изображения
+
+    :param data: содержимое загруженного файла
+    :type data: байты
+    :return: словарь размер -> (mime-тип, содержимое)
+    """
+    image = _decode(data)
+    return {size: _encode(_render(image, size)) for size in SIZES}
+
+
+def _store_sizes(source_hash, data):
+    ImageVariant.query.filter_by(source_hash=source_hash).delete()
+    for size, (mimetype, content) in render_sizes(data).items():
+        db.session.add(ImageVariant(source_hash=source_hash, size=size, mimetype=mimetype,
+                                    digest=store.put(content)))
+
+
+def attach(entity, data):
+    """
+    метод сохранения нового изображения пользователя, чата или новости
+
+    Размеры хранятся в хранилище отдельно от строки объекта и переиспользуются,
+    если такое же изображение уже загружалось.
+
+    :param entity: пользователь, чат или новость
+    :type entity: объект с изображением
+    :param data: содержимое загруженного файла
+    :type data: байты
+    :return: ничего не возвращает
+    """
+    source_hash = digest(data)
+    if ImageVariant.query.filter_by(source_hash=source_hash).count() < len(SIZES):
+        _store_sizes(source_hash, data)
+    entity.image_hash = source_hash
+
+
+def attach_later(kind, entity, upload, user=None):
+    """
+    метод сохранения загруженного файла и постановки задачи подготовки его размеров
+
+    Здесь проверяются только сигнатура и размер файла, полная проверка выполняется задачей.
+
+    :param kind: тип объекта (user, chat или news)
+    :type kind: строка
+    :param entity: пользователь, чат или новость
+    :type entity: объект с изображением
+    :param upload: принятый файл, request.files[...].stream
+    :type upload: uploads.SpooledUpload
+    :param user: пользователь, которому видно состояние задачи
+    :type user: пользователь
+    :return: задача
+    """
+    upload.seek(0)
+    mimetype = guess_mimetype(upload.read(12))
+    if mimetype == 'application/octet-stream':
+        raise ImageError('файл не похож на изображение')
+    upload.check_limit(mimetype)
+    source_hash = store.put_file(upload)
+    return jobs.enqueue('images.attach', user=user, kind=kind, entity_id=entity.id, source_hash=source_hash)
+
+
+@jobs.task('images.attach')
+def attach_job(kind, entity_id, source_hash):
+    entity = MODELS[kind].query.get(entity_id)
+    if entity is None:
+        return
+    data = store.get(source_hash)
+    if data is None:
+        raise jobs.JobError('изображение отсутствует в хранилище')
+    try:
+        attach(entity, data)
+    except ImageError as e:
+        raise jobs.JobError(str(e))
+    if kind == 'user':
+        entity.bump_news_versions()
+    elif kind == 'news':
+        entity.bump_version()
+
+
+def rebuild():
+    """
+    метод подготовки размеров для изображений, загруженных до их появления
+
+    Такие изображения лежат в хранилище целиком под своим хэшем.
+
+    :return: количество обработанных изображений и количество ошибок
+    """
+    done, failed = 0, 0
+    for model in (User, Chat, News):
+        hashes = db.session.query(model.image_hash).filter(model.image_hash.isnot(None)).distinct().all()
+        for source_hash, in hashes:
+            if ImageVariant.query.filter_by(source_hash=source_hash).count() == len(SIZES):
+                continue
+            data = store.get(source_hash)
+            try:
+                if data is None:
+                    raise ImageError('изображение отсутствует в хранилище')
+                _store_sizes(source_hash, data)
+            except ImageError as e:
+                app.logger.warning('%s %s: %s', model.__tablename__, source_hash, e)
+                failed += 1
+                continue
+            db.session.commit()
+            done += 1
+    return done, failed
@@ -0,0 +1,128 @@
+"""
+модуль invitations
+
+Приглашения в чаты пачками. Приглашение нескольких пользователей, а также
+принятие и отклонение нескольких приглашений выполняются несколькими
+запросами на всю пачку в одной транзакции. Повторные приглашения и
+приглашения участникам чата пропускаются, а пара (пользователь, чат)
+уникальна в таблице invitation.
+"""
+
+import re
+from collections import namedtuple
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import joinedload
+from app import db, membership
+from app.models import User, Invitation
+
+invitation_table = Invitation.__table__
+
+InviteResult = namedtuple('InviteResult', ['invited', 'skipped', 'unknown'])
+
+
+def parse_usernames(text):
+    """
+    метод разбора списка имён через запятую или пробел
+
+    :param text: строка с именами
+    :type text: строка
+    :return: список имён без повторов в исходном порядке
+    """
+    names = []
+    for name in re.split(r'[,;\s]+', text or ''):
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def invite(chat, usernames):
+    """
+    метод приглашения пользователей в чат
+
+    :param chat: чат
+    :type chat: чат
+    :param usernames: имена приглашаемых
+    :type usernames: список строк
+    :return: InviteResult: имена приглашённых, пропущенных (уже участники
+        или уже приглашены) и несуществующих пользователей
+    """
+    users = {username: user_id for user_id, username in
+             db.session.query(User.id, User.username).filter(User.username.in_(usernames))} if usernames else {}
+    unknown = [name for name in usernames if name not in users]
+    user_ids = set(users.values())
+    taken = set(membership.members(chat.id))
+    if user_ids:
+        taken.update(row[0] for row in db.session.execute(
+            select([invitation_table.c.user_id]).where(and_(invitation_table.c.chat_id == chat.id,
+                                                            invitation_table.c.user_id.in_(user_ids)))))
+    invited = [name for name in usernames if name in users and users[name] not in taken]
+    skipped = [name for name in usernames if name in users and users[name] in taken]
+    if invited:
+        db.session.execute(invitation_table.insert(), [dict(user_id=users[name], chat_id=chat.id)
+                                                       for name in invited])
+    return InviteResult(invited, skipped, unknown)
+
+
+def _own(user, invitation_ids):
+    return and_(invitation_table.c.user_id == user.id, invitation_table.c.id.in_(invitation_ids))
+
+
+def accept(user, invitation_ids):
+    """
+    метод принятия приглашений пользователя
+
+    :param user: пользователь
+    :type user: пользователь
+    :param invitation_ids: id приглашений; чужие приглашения пропускаются
+    :type invitation_ids: список чисел
+    :return: количество принятых приглашений
+    """
+    if not invitation_ids:
+        return 0
+    rows = db.session.execute(select([invitation_table.c.id, invitation_table.c.chat_id])
+                              .where(_own(user, invitation_ids))).fetchall()
+    if not rows:
+        return 0
+    membership.add(user, [chat_id for invitation_id, chat_id in rows])
+    db.session.execute(invitation_table.delete().where(
+        invitation_table.c.id.in_([invitation_id for invitation_id, chat_id in rows])))
+    return len(rows)
+
+
+def decline(user, invitation_ids):
+    """
+    метод отклонения приглашений пользователя
+
+    :param user: пользователь
+    :type user: пользователь
+    :param invitation_ids: id приглашений; чужие приглашения пропускаются
+    :type invitation_ids: список чисел
+    :return: количество отклонённых приглашений
+    """
+    if not invitation_ids:
+        return 0
+    return db.session.execute(invitation_table.delete().where(_own(user, invitation_ids))).rowcount
+
+
+def count_for(user):
+    """
+    метод подсчёта приглашений пользователя одним агрегатным запросом
+
+    :param user: пользователь
+    :type user: пользователь
+    :return: количество приглашений
+    """
+    return db.session.query(func.count(Invitation.id)).filter(Invitation.user_id == user.id).scalar()
+
+
+def pending(user):
+    """
+    метод получения приглашений пользователя вместе с чатами
+
+    :param user: пользователь
+    :type user: пользователь
+    :return: список приглашений
+    """
+    return Invitation.query.filter_by(user_id=user.id).options(joinedload(Invitation.chat)) \
+        .order_by(Invitation.id).all()
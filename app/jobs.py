@@ -0,0 +1,295 @@
+"""
+модуль jobs
+
+Фоновые задачи. Запрос только записывает задачу в таблицу job в своей
+транзакции, а работа, которая зависит от размера изображения или количества
+друзей, выполняется после commit вне запроса. Задача, упавшая с ошибкой,
+повторяется с растущей задержкой до JOB_MAX_ATTEMPTS раз, состояние задачи
+можно узнать по адресу /jobs/<id>.
+
+Исполнитель выбирается настройкой JOB_BACKEND:
+
+* thread - пул из JOB_WORKERS потоков внутри процесса сайта;
+* database - задачи только записываются в таблицу, их выполняют процессы
+  `flask jobs work`, в том числе на других машинах;
+* inline - задача выполняется сразу после commit до ответа на запрос,
+  повторы без задержки (для разработки и отладки).
+
+Задача объявляется декоратором task в модуле, к которому она относится, и
+получает аргументы, переданные в enqueue. Изменения задачи сохраняются одним
+commit вместе с отметкой о её выполнении.
+"""
+
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from app import app, db
+from app.models import Job
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+TASKS = {}
+
+
+class JobError(Exception):
+    """
+    ошибка задачи, после которой повторять её бесполезно
+    """
+    pass
+
+
+def task(name):
+    """
+    декоратор объявления фоновой задачи
+
+    :param name: имя задачи, под которым она ставится в очередь
+    :type name: строка
+    :return: декоратор
+    """
+    def decorator(function):
+        TASKS[name] = function
+        return function
+    return decorator
+
+
+def enqueue(name, user=None, **payload):
+    """
+    метод постановки задачи в очередь
+
+    Задача записывается в текущую транзакцию и передаётся исполнителю после
+    её commit, поэтому она видит всё, что записал запрос.
+
+    :param name: имя задачи
+    :type name: строка
+    :param user: пользователь, которому видно состояние задачи
+    :type user: пользователь
+    :param payload: аргументы задачи, должны сохраняться в json
+    :return: задача
+    """
+    now = datetime.utcnow()
+    job = Job(name=name, payload=json.dumps(payload), status=QUEUED, attempts=0,
+              max_attempts=app.config['JOB_MAX_ATTEMPTS'], user_id=user.id if user is not None else None,
+              created_at=now, run_at=now)
+    db.session.add(job)
+    db.session.flush()
+    db.session.info.setdefault('jobs', []).append(job.id)
+    return job
+
+
+@event.listens_for(db.session, 'after_commit')
+def submit_pending(session):
+    for job_id in session.info.pop('jobs', ()):
+        runner.submit(job_id)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def forget_pending(session, previous_transaction):
+    session.info.pop('jobs', None)
+
+
+def _retry_delay(attempts):
+    return app.config['JOB_RETRY_DELAY'] * 2 ** (attempts - 1)
+
+
+def _run(job_id):
+    claimed = Job.query.filter(Job.id == job_id, Job.status == QUEUED) \
+        .update({Job.status: RUNNING, Job.attempts: Job.attempts + 1, Job.run_at: datetime.utcnow()},
+                synchronize_session=False)
+    db.session.commit()
+    if not claimed:
+        return None
+    job = Job.query.get(job_id)
+    name = job.name
+    function = TASKS.get(name)
+    try:
+        if function is None:
+            raise JobError('неизвестная задача')
+        function(**json.loads(job.payload))
+        job.status = DONE
+        job.error = None
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        return None
+    except Exception as e:
+        db.session.rollback()
+        app.logger.exception('задача %s %s', job_id, name)
+        job = Job.query.get(job_id)
+        job.error = '{}: {}'.format(type(e).__name__, e)
+        delay = None
+        if isinstance(e, JobError) or job.attempts >= job.max_attempts:
+            job.status = FAILED
+            job.finished_at = datetime.utcnow()
+        else:
+            delay = _retry_delay(job.attempts)
+            job.status = QUEUED
+            job.run_at = datetime.utcnow() + timedelta(seconds=delay)
+        db.session.commit()
+        return delay
+
+
+def execute(job_id):
+    """
+    метод выполнения одной задачи
+
+    Задача сначала переводится из queued в running, поэтому два исполнителя
+    не выполнят её дважды.
+
+    :param job_id: id задачи
+    :type job_id: число
+    :return: задержка до повтора в секундах или None, если повтора не будет
+    """
+    with app.app_context():
+        try:
+            return _run(job_id)
+        finally:
+            db.session.remove()
+
+
+class JobRunner(ABC):
+    """
+    базовый класс исполнителя задач
+    """
+
+    @abstractmethod
+    def submit(self, job_id):
+        """
+        метод передачи записанной задачи на выполнение
+
+        :param job_id: id задачи
+        :type job_id: число
+        :return: ничего не возвращает
+        """
+
+
+class ThreadJobRunner(JobRunner):
+    """
+    пул потоков в процессе сайта, повтор ставится на таймер
+    """
+
+    def __init__(self, workers):
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='jobs')
+
+    def submit(self, job_id):
+        self.executor.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        delay = execute(job_id)
+        if delay is not None:
+            timer = threading.Timer(delay, self.submit, (job_id,))
+            timer.daemon = True
+            timer.start()
+
+
+class DatabaseJobRunner(JobRunner):
+    """
+    задачи остаются в таблице до `flask jobs work`
+    """
+
+    def submit(self, job_id):
+        pass
+
+
+class InlineJobRunner(JobRunner):
+    """
+    выполнение сразу в отдельном потоке с ожиданием его завершения,
+    чтобы задача работала в своей сессии
+    """
+
+    def submit(self, job_id):
+        worker = threading.Thread(target=self._run, args=(job_id,))
+        worker.start()
+        worker.join()
+
+    def _run(self, job_id):
+        while execute(job_id) is not None:
+            pass
+
+
+BACKENDS = {
+    'thread': lambda config: ThreadJobRunner(config['JOB_WORKERS']),
+    'database': lambda config: DatabaseJobRunner(),
+    'inline': lambda config: InlineJobRunner(),
+}
+
+
+def create_runner(config):
+    """
+    метод создания исполнителя по настройкам приложения
+
+    :param config: настройки приложения
+    :type config: словарь
+    :return: исполнитель задач
+    """
+    return BACKENDS[config['JOB_BACKEND']](config)
+
+
+runner = create_runner(app.config)
+
+
+def due_jobs(limit=100):
+    """
+    метод получения задач, время выполнения которых наступило
+
+    :param limit: наибольшее количество задач
+    :type limit: число
+    :return: список id задач
+    """
+    query = db.session.query(Job.id).filter(Job.status == QUEUED, Job.run_at <= datetime.utcnow()) \
+        .order_by(Job.run_at, Job.id).limit(limit)
+    job_ids = [job_id for job_id, in query]
+    db.session.commit()
+    return job_ids
+
+
+def work(once=False):
+    """
+    метод выполнения задач из таблицы, например для JOB_BACKEND=database
+    или после перезапуска сайта с невыполненными задачами
+
+    :param once: выйти, когда готовых задач не останется
+    :type once: bool
+    :return: количество выполненных попыток
+    """
+    count = 0
+    while True:
+        job_ids = due_jobs()
+        for job_id in job_ids:
+            execute(job_id)
+            count += 1
+        if not job_ids:
+            if once:
+                return count
+            time.sleep(app.config['JOB_POLL_INTERVAL'])
+
+
+def requeue_stale(seconds):
+    """
+    метод возврата в очередь задач, которые остались в running после
+    остановки процесса, выполнявшего их (run_at задачи в running - время запуска)
+
+    :param seconds: сколько секунд задача должна числиться в running
+    :type seconds: число
+    :return: количество возвращённых задач
+    """
+    count = Job.query.filter(Job.status == RUNNING,
+                             Job.run_at <= datetime.utcnow() - timedelta(seconds=seconds)) \
+        .update({Job.status: QUEUED}, synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def counts():
+    """
+    метод подсчёта задач по состояниям
+
+    :return: словарь состояние -> количество
+    """
+    return dict(db.session.query(Job.status, db.func.count(Job.id)).group_by(Job.status))
@@ -0,0 +1,135 @@
+"""
+модуль membership
+
+Проверка участия пользователя в чате. Таблица user_chats имеет первичный
+ключ (user_id, chat_id) и индекс (chat_id, user_id), поэтому и проверка одной
+пары, и список участников чата читаются по индексу. Списки участников
+хранятся в LRU в памяти процесса на MEMBERSHIP_CACHE_SIZE чатов не дольше
+MEMBERSHIP_CACHE_TTL секунд, так что проверка на странице чата обычно не
+обращается к бд.
+
+Пользователь, которого нет в списке из кэша, проверяется по бд: так новый
+участник, добавленный другим процессом, не ждёт устаревания кэша.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import and_, event, exists, select
+from app import app, db
+from app.models import user_chats
+
+
+class MemberCache(object):
+    """
+    LRU множеств id участников чатов с ограничением по времени
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, chat_id):
+        with self._lock:
+            item = self._items.get(chat_id)
+            if item is None:
+                return None
+            loaded, user_ids = item
+            if time.monotonic() - loaded > self.ttl:
+                del self._items[chat_id]
+                return None
+            self._items.move_to_end(chat_id)
+            return user_ids
+
+    def set(self, chat_id, user_ids):
+        with self._lock:
+            self._items[chat_id] = (time.monotonic(), user_ids)
+            self._items.move_to_end(chat_id)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, chat_ids):
+        with self._lock:
+            for chat_id in chat_ids:
+                self._items.pop(chat_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+cache = MemberCache(app.config['MEMBERSHIP_CACHE_SIZE'], app.config['MEMBERSHIP_CACHE_TTL'])
+
+
+def members(chat_id):
+    """
+    метод получения участников чата
+
+    :param chat_id: id чата
+    :type chat_id: число
+    :return: множество id участников
+    """
+    user_ids = cache.get(chat_id)
+    if user_ids is None:
+        user_ids = frozenset(row[0] for row in db.session.execute(
+            select([user_chats.c.user_id]).where(user_chats.c.chat_id == chat_id)))
+        cache.set(chat_id, user_ids)
+    return user_ids
+
+
+def is_member(user, chat_id):
+    """
+    метод проверки, что пользователь состоит в чате
+
+    :param user: пользователь
+    :type user: пользователь
+    :param chat_id: id чата
+    :type chat_id: число
+    :return: True или False
+    """
+    if user.id in members(chat_id):
+        return True
+    found = db.session.query(exists().where(and_(user_chats.c.user_id == user.id,
+                                                 user_chats.c.chat_id == chat_id))).scalar()
+    if found:
+        cache.invalidate([chat_id])
+    return found
+
+
+def add(user, chat_ids):
+    """
+    метод добавления пользователя в чаты, в которых он ещё не состоит
+
+    Строки участия вставляются одним запросом, кэш участников этих чатов
+    сбрасывается после commit.
+
+    :param user: пользователь
+    :type user: пользователь
+    :param chat_ids: id чатов
+    :type chat_ids: список чисел
+    :return: множество id чатов, в которые пользователь добавлен
+    """
+    chat_ids = set(chat_ids)
+    if not chat_ids:
+        return set()
+    chat_ids.difference_update(row[0] for row in db.session.execute(
+        select([user_chats.c.chat_id]).where(and_(user_chats.c.user_id == user.id,
+                                                  user_chats.c.chat_id.in_(chat_ids)))))
+    if chat_ids:
+        db.session.execute(user_chats.insert(), [dict(user_id=user.id, chat_id=chat_id, unread=0)
+                                                 for chat_id in chat_ids])
+        db.session.info.setdefault('changed_chats', set()).update(chat_ids)
+    return chat_ids
+
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_changed(session):
+    cache.invalidate(session.info.pop('changed_chats', ()))
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def forget_changed(session, previous_transaction):
+    session.info.pop('changed_chats', None)
@@ -3,28 +3,53 @@
 """
 
 import pytz
+from collections import namedtuple
 from datetime import datetime
 from app import db
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
-from app import login
 from hashlib import md5
-from base64 import b64encode
+from flask import url_for
+from sqlalchemy import and_, or_, select
 
 
 followers = db.Table('followers',
                      db.Column('follower_id', db.Integer, db.ForeignKey('user.id')),
-                     db.Column('followed_id', db.Integer, db.ForeignKey('user.id'))
+                     db.Column('followed_id', db.Integer, db.ForeignKey('user.id')),
+                     db.Index('ix_followers_pair', 'follower_id', 'followed_id', unique=True),
+                     db.Index('ix_followers_followed', 'followed_id', 'follower_id')
                      )
 
 
+Friends = namedtuple('Friends', ['followers', 'followed', 'mutual'])
+
+
+class ImageMixin(object):
+    """
+    общие методы моделей с изображением
+    """
+    image_hash = db.Column(db.String(64), default=None)
+
+    def image_url(self, size='profile'):
+        """
+        метод получения адреса изображения
+
+        :param size: размер изображения (avatar, profile или news)
+        :type size: строка
+        :return: адрес изображения или None, если изображения нет
+        """
+        if self.image_hash is not None:
+            return url_for('image', kind=self.__tablename__, entity_id=self.id, size=size,
+                           digest=self.image_hash)
+
+
 user_news = db.Table('user_news',
                       db.Column('user_id', db.Integer, db.ForeignKey('user.id')),
                       db.Column('news_id', db.Integer, db.ForeignKey('news.id'))
                       )
 
 
-class User(UserMixin, db.Model):
+class User(UserMixin, ImageMixin, db.Model):
     """
     Таблица пользователя
     """
@@ -41,17 +66,12 @@ class User(UserMixin, db.Model):
         primaryjoin=(followers.c.follower_id == id),
         secondaryjoin=(followers.c.followed_id == id),
         backref=db.backref('followers', lazy='dynamic'), lazy='dynamic')
-    image = db.Column(db.BLOB, default=None)
     news = db.relationship('News', backref='author', lazy='dynamic')
     liked_news = db.relationship('User', secondary=user_news, backref='liked_users')
 
     def __repr__(self):
         return '<User {}>'.format(self.username)
 
-    def get_image(self):
-        if self.image is not None:
-            return b64encode(self.image).decode('UTF-8')
-
     def set_password(self, password):
         """
         метод установки пароля
@@ -119,23 +139,51 @@ class User(UserMixin, db.Model):
         return self.followed.filter(
             followers.c.followed_id == user.id).count() > 0
 
+    def is_friend(self, user):
+        """
+        метод проверки, связаны ли пользователи дружбой в любую сторону
 
-@login.user_loader
-def load_user(id):
-    """
-    метод загрузки пользователя из бд
+        :param user: пользователь, которого нужно проверить
+        :type user: пользователь
+        :return: True или False
+        """
+        return db.session.query(followers).filter(or_(
+            and_(followers.c.follower_id == self.id, followers.c.followed_id == user.id),
+            and_(followers.c.follower_id == user.id, followers.c.followed_id == self.id))).count() > 0
 
-    :param id: id пользователя
-    :type id: число
-    :return: пользователь
-    """
-    return User.query.get(int(id))
+    def bump_news_versions(self):
+        """
+        метод отметки изменения новостей, в которых видно имя или аватар пользователя:
+        его собственных и прокомментированных им
+
+        :return: ничего не возвращает
+        """
+        commented = db.session.query(Post.news_id).filter(Post.user_id == self.id, Post.news_id.isnot(None))
+        News.query.filter(or_(News.user_id == self.id, News.id.in_(commented))) \
+            .update({News.version: News.version + 1}, synchronize_session=False)
+
+    def friends(self):
+        """
+        метод получения друзей пользователя двумя запросами к таблице followers
+
+        :return: подписчики, подписки и взаимные друзья (списки пользователей)
+        """
+        follower_list = User.query.join(followers, followers.c.follower_id == User.id) \
+            .filter(followers.c.followed_id == self.id).order_by(User.username).all()
+        followed_list = User.query.join(followers, followers.c.followed_id == User.id) \
+            .filter(followers.c.follower_id == self.id).order_by(User.username).all()
+        follower_ids = {user.id for user in follower_list}
+        mutual = [user for user in followed_list if user.id in follower_ids]
+        return Friends(follower_list, followed_list, mutual)
 
 
 class Post(db.Model):
     """
     таблица сообщений пользователей
     """
+    __table_args__ = (
+        db.Index('ix_post_chat_timestamp_id', 'chat_id', 'timestamp', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.String(140))
     timestamp = db.Column(db.DateTime, index=True, default=datetime.now(pytz.timezone('Europe/Moscow')))
@@ -151,41 +199,201 @@ class Invitation(db.Model):
     """
     таблица приглашений пользователей в чаты
     """
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'chat_id', name='uq_invitation_user_chat'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     chat_id = db.Column(db.Integer, db.ForeignKey('chat.id'))
 
 
 user_chats = db.Table('user_chats',
-                      db.Column('user_id', db.Integer, db.ForeignKey('user.id')),
-                      db.Column('chat_id', db.Integer, db.ForeignKey('chat.id'))
+                      db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
+                      db.Column('chat_id', db.Integer, db.ForeignKey('chat.id'), primary_key=True),
+                      db.Column('unread', db.Integer, nullable=False, default=0, server_default='0'),
+                      db.Index('ix_user_chats_chat_user', 'chat_id', 'user_id')
                       )
 
 
-class Chat(db.Model):
+class Chat(ImageMixin, db.Model):
     """
     таблица чатов
     """
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), index=True)
     users = db.relationship('User', secondary=user_chats, backref='chats')
-    posts = db.relationship('Post', backref='chat', lazy='dynamic')
+    posts = db.relationship('Post', backref='chat', lazy='dynamic', foreign_keys='Post.chat_id')
     invitations = db.relationship('Invitation', backref='chat', lazy='dynamic')
-    image = db.Column(db.BLOB, default=None)
+    last_post_id = db.Column(db.Integer, db.ForeignKey('post.id', use_alter=True, name='fk_chat_last_post_id'))
+    last_post = db.relationship('Post', foreign_keys=[last_post_id], post_update=True)
+    last_activity = db.Column(db.DateTime, index=True)
 
-    def get_image(self):
-        if self.image is not None:
-            return b64encode(self.image).decode('UTF-8')
+    def register_post(self, post):
+        """
+        метод учёта нового сообщения: запоминает последнее сообщение чата
+        и увеличивает счётчики непрочитанных у остальных участников
 
+        :param post: новое сообщение
+        :type post: сообщение
+        :return: ничего не возвращает
+        """
+        db.session.add(post)
+        self.last_post = post
+        self.last_activity = post.timestamp
+        db.session.flush()
+        db.session.execute(user_chats.update()
+                           .where(and_(user_chats.c.chat_id == self.id, user_chats.c.user_id != post.user_id))
+                           .values(unread=user_chats.c.unread + 1))
+
+    def mark_read(self, user):
+        """
+        метод сброса счётчика непрочитанных сообщений участника
+
+        Счётчик сначала читается с основной бд, и запись выполняется, только если
+        он не нулевой, поэтому просмотр прочитанного чата не открывает транзакцию записи.
 
-class News(db.Model):
+        :param user: участник чата
+        :type user: пользователь
+        :return: True, если счётчик был сброшен
+        """
+        member = and_(user_chats.c.chat_id == self.id, user_chats.c.user_id == user.id)
+        unread = db.session.execute(select([user_chats.c.unread]).where(member), bind=db.engine).scalar()
+        if not unread:
+            return False
+        db.session.execute(user_chats.update().where(and_(member, user_chats.c.unread != 0)).values(unread=0))
+        return True
+
+    def interlocutor(self, user):
+        """
+        метод получения собеседника в личной переписке
+
+        :param user: участник чата
+        :type user: пользователь
+        :return: второй участник личной переписки или None для беседы
+        """
+        if self.direct is None:
+            return None
+        return self.direct.other(user)
+
+
+class DirectChat(db.Model):
+    """
+    таблица личных переписок: чат двух пользователей по паре их id,
+    меньший id всегда в user_low_id
+    """
+    __tablename__ = 'direct_chat'
+    user_low_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    user_high_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    chat_id = db.Column(db.Integer, db.ForeignKey('chat.id'), nullable=False, unique=True)
+    chat = db.relationship('Chat', backref=db.backref('direct', uselist=False))
+    user_low = db.relationship('User', foreign_keys=[user_low_id])
+    user_high = db.relationship('User', foreign_keys=[user_high_id])
+
+    @staticmethod
+    def key(user, other):
+        """
+        метод получения первичного ключа переписки двух пользователей
+
+        :param user: пользователь
+        :type user: пользователь
+        :param other: собеседник
+        :type other: пользователь
+        :return: пара (меньший id, больший id)
+        """
+        return min(user.id, other.id), max(user.id, other.id)
+
+    def other(self, user):
+        """
+        метод получения собеседника пользователя
+
+        :param user: участник переписки
+        :type user: пользователь
+        :return: второй участник
+        """
+        return self.user_high if user.id == self.user_low_id else self.user_low
+
+
+class News(ImageMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     text = db.Column(db.String(140))
     timestamp = db.Column(db.DateTime, index=True, default=datetime.now(pytz.timezone('Europe/Moscow')))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    image = db.Column(db.BLOB, default=None)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     comments = db.relationship('Post', backref='news', lazy='dynamic')
 
-    def get_image(self):
-        if self.image is not None:
-            return b64encode(self.image).decode('UTF-8')
+    def bump_version(self):
+        """
+        метод отметки изменения новости, после которого её блок рендерится заново
+
+        :return: ничего не возвращает
+        """
+        self.version = News.version + 1
+
+
+class FeedItem(db.Model):
+    """
+    таблица ленты новостей: по одной строке на каждую новость в ленте каждого читателя
+    """
+    __table_args__ = (
+        db.Index('ix_feed_item_user_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_feed_item_user_author', 'user_id', 'author_id'),
+        db.UniqueConstraint('user_id', 'news_id', name='uq_feed_item_user_news'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    author_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    news_id = db.Column(db.Integer, db.ForeignKey('news.id'), nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    news = db.relationship('News')
+
+
+class ImageVariant(db.Model):
+    """
+    таблица подготовленных размеров изображений, общая для пользователей, чатов и новостей
+    """
+    __table_args__ = (
+        db.UniqueConstraint('source_hash', 'size', name='uq_image_variant_source_size'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    source_hash = db.Column(db.String(64), nullable=False)
+    size = db.Column(db.String(16), nullable=False)
+    mimetype = db.Column(db.String(32), nullable=False)
+    digest = db.Column(db.String(64), nullable=False)
+
+
+class Job(db.Model):
+    """
+    таблица фоновых задач: имя задачи, её аргументы в json и состояние выполнения
+    """
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(16), nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    max_attempts = db.Column(db.Integer, nullable=False)
+    error = db.Column(db.Text)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    run_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        """
+        метод получения состояния задачи для ответа в json
+
+        :return: словарь
+        """
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'run_at': self.run_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
@@ -0,0 +1,100 @@
+"""
+модуль presence
+
+Время последнего действия пользователей копится в памяти процесса и
+записывается в бд одним запросом раз в LAST_SEEN_FLUSH_INTERVAL секунд фоновым
+потоком, а не во время обработки запроса. Отметка пользователя обновляется,
+только если она устарела больше чем на LAST_SEEN_THRESHOLD секунд.
+
+Отметки, которые не удалось записать, возвращаются в очередь до следующей
+попытки, а при завершении процесса записываются остатки.
+"""
+
+import atexit
+import threading
+import time
+from datetime import datetime
+
+import pytz
+from sqlalchemy import bindparam
+from sqlalchemy.orm.attributes import set_committed_value
+from app import app, db
+from app.models import User
+
+
+class PresenceTracker(object):
+    """
+    накопитель отметок о последнем действии пользователей
+    """
+
+    def __init__(self, threshold, interval):
+        self.threshold = threshold
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._seen = {}
+        self._flusher = None
+
+    def touch(self, user):
+        """
+        метод отметки действия пользователя
+
+        :param user: пользователь
+        :type user: пользователь
+        :return: ничего не возвращает
+        """
+        now = datetime.now(pytz.timezone('Europe/Moscow')).replace(tzinfo=None)
+        with self._lock:
+            last = self._seen.get(user.id, user.last_seen)
+            if last is not None and (now - last).total_seconds() < self.threshold:
+                return
+            self._pending[user.id] = now
+            self._seen[user.id] = now
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name='presence-flusher', daemon=True)
+                self._flusher.start()
+        # объект в сессии видит новое значение, но не считается изменённым
+        set_committed_value(user, 'last_seen', now)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with app.app_context():
+                self.flush()
+
+    def flush(self):
+        """
+        метод записи накопленных отметок в бд отдельным соединением
+
+        :return: количество записанных отметок
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            now = datetime.now(pytz.timezone('Europe/Moscow')).replace(tzinfo=None)
+            self._seen = {user_id: seen for user_id, seen in self._seen.items()
+                          if (now - seen).total_seconds() < self.threshold}
+        if not pending:
+            return 0
+        table = User.__table__
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(table.update().where(table.c.id == bindparam('user_id'))
+                                   .values(last_seen=bindparam('seen')),
+                                   [dict(user_id=user_id, seen=seen) for user_id, seen in pending.items()])
+        except Exception:
+            app.logger.exception('presence: не удалось записать отметки last_seen')
+            with self._lock:
+                # более свежие отметки, появившиеся за время записи, не затираются
+                for user_id, seen in pending.items():
+                    self._pending.setdefault(user_id, seen)
+            return 0
+        return len(pending)
+
+
+tracker = PresenceTracker(app.config['LAST_SEEN_THRESHOLD'], app.config['LAST_SEEN_FLUSH_INTERVAL'])
+
+
+@atexit.register
+def flush_on_exit():
+    with app.app_context():
+        tracker.flush()
@@ -0,0 +1,196 @@
+"""
+модуль profiling
+
+Подсчёт sql-запросов, выполненных за время обработки запроса к сайту.
+Если задан QUERY_BUDGET, страница, превысившая его, в режиме отладки и в
+тестах завершается ошибкой, а в остальных случаях попадает в журнал.
+
+При PROFILING = True дополнительно замеряется время бд, шаблонов и всего
+запроса. Сводка по каждому обработчику доступна на /_stats, ответы получают
+заголовок Server-Timing, а при PROFILING_LOG каждый запрос пишется в журнал
+строкой json.
+"""
+
+import hmac
+import json
+import threading
+import time
+from collections import deque
+
+from flask import g, has_request_context, request, jsonify, abort, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import app
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    ошибка превышения количества запросов к бд на одну страницу
+    """
+    pass
+
+
+class EndpointStats(object):
+    """
+    накопитель замеров по обработчикам страниц
+    """
+
+    def __init__(self, samples):
+        self.samples = samples
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, total, db_time, template_time, queries):
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = {
+                    'requests': 0, 'queries': 0, 'total': 0.0, 'db': 0.0, 'template': 0.0,
+                    'latencies': deque(maxlen=self.samples),
+                }
+            stats['requests'] += 1
+            stats['queries'] += queries
+            stats['total'] += total
+            stats['db'] += db_time
+            stats['template'] += template_time
+            stats['latencies'].append(total)
+
+    def snapshot(self):
+        """
+        метод получения сводки по обработчикам
+
+        :return: словарь обработчик -> средние значения и перцентили задержки в миллисекундах
+        """
+        with self._lock:
+            endpoints = {name: dict(stats, latencies=sorted(stats['latencies']))
+                         for name, stats in self._endpoints.items()}
+        result = {}
+        for name, stats in endpoints.items():
+            requests, latencies = stats['requests'], stats['latencies']
+            result[name] = {
+                'requests': requests,
+                'queries_avg': round(stats['queries'] / requests, 2),
+                'total_ms_avg': round(stats['total'] * 1000 / requests, 2),
+                'db_ms_avg': round(stats['db'] * 1000 / requests, 2),
+                'template_ms_avg': round(stats['template'] * 1000 / requests, 2),
+                'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+
+def percentile(values, percent):
+    """
+    метод вычисления перцентиля по отсортированному списку
+
+    :param values: отсортированные значения
+    :type values: список
+    :param percent: перцентиль от 0 до 100
+    :type percent: число
+    :return: значение перцентиля или 0 для пустого списка
+    """
+    if not values:
+        return 0
+    index = min(len(values) - 1, int(round(percent / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+stats = EndpointStats(app.config['PROFILING_SAMPLES'])
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def time_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if has_request_context() and started:
+        g.db_time = g.get('db_time', 0.0) + time.perf_counter() - started.pop()
+
+
+@before_render_template.connect_via(app)
+def start_template(sender, template, context, **extra):
+    g.template_started = time.perf_counter()
+
+
+@template_rendered.connect_via(app)
+def stop_template(sender, template, context, **extra):
+    started = g.pop('template_started', None)
+    if started is not None:
+        g.template_time = g.get('template_time', 0.0) + time.perf_counter() - started
+
+
+@app.before_request
+def reset_query_count():
+    g.query_count = 0
+    g.db_time = 0.0
+    g.template_time = 0.0
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def check_query_budget(response):
+    """
+    метод проверки количества запросов к бд и записи замеров после обработки страницы
+
+    :param response: ответ
+    :type response: ответ
+    :return: ответ
+    """
+    count = g.get('query_count', 0)
+    if app.debug or app.testing:
+        response.headers['X-Query-Count'] = str(count)
+    if app.config['PROFILING'] and request.endpoint not in (None, 'static', 'stats_view'):
+        record_request(response, count)
+    budget = app.config['QUERY_BUDGET']
+    if budget is not None and count > budget:
+        message = '{} {}: {} sql-запросов при бюджете {}'.format(request.endpoint, response.status_code,
+                                                                  count, budget)
+        if app.debug or app.testing:
+            raise QueryBudgetExceeded(message)
+        app.logger.warning(message)
+    return response
+
+
+def record_request(response, count):
+    total = time.perf_counter() - g.request_started
+    db_time, template_time = g.get('db_time', 0.0), g.get('template_time', 0.0)
+    stats.record(request.endpoint, total, db_time, template_time, count)
+    response.headers['Server-Timing'] = 'db;dur={:.1f}, tpl;dur={:.1f}, total;dur={:.1f}'.format(
+        db_time * 1000, template_time * 1000, total * 1000)
+    if app.config['PROFILING_LOG']:
+        app.logger.info(json.dumps({
+            'endpoint': request.endpoint, 'method': request.method, 'status': response.status_code,
+            'queries': count, 'db_ms': round(db_time * 1000, 2), 'template_ms': round(template_time * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+        }))
+
+
+@app.route('/_stats')
+def stats_view():
+    """
+    метод отдачи сводки замеров по обработчикам
+
+    Доступен только при включённом PROFILING, в режиме отладки или
+    с заголовком X-Stats-Token, равным PROFILING_STATS_TOKEN. Адрес клиента
+    не проверяется: за прокси на той же машине все запросы приходят с 127.0.0.1.
+
+    :return: сводка в формате json
+    """
+    token = app.config['PROFILING_STATS_TOKEN']
+    header = request.headers.get('X-Stats-Token', '')
+    allowed = app.debug or (token is not None and hmac.compare_digest(header.encode(), token.encode()))
+    if not app.config['PROFILING'] or not allowed:
+        abort(404)
+    if request.args.get('reset'):
+        stats.reset()
+    return jsonify(stats.snapshot())
@@ -0,0 +1,168 @@
+"""
+модуль queries
+
+Запросы, которые страницы используют для выборки данных. Авторы сообщений,
+новостей и комментариев подгружаются вместе с ними, чтобы шаблоны не делали
+отдельный запрос на каждый элемент.
+"""
+
+from collections import defaultdict
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import Post, News, Chat, DirectChat, FeedItem, user_chats
+
+
+def chat_list(user):
+    """
+    метод выборки чатов пользователя с количеством непрочитанных сообщений
+
+    :param user: пользователь
+    :type user: пользователь
+    :return: список пар (чат, непрочитано), сначала чаты с последней активностью
+    """
+    return db.session.query(Chat, user_chats.c.unread) \
+        .join(user_chats, user_chats.c.chat_id == Chat.id) \
+        .filter(user_chats.c.user_id == user.id) \
+        .options(joinedload(Chat.last_post),
+                 joinedload(Chat.direct).joinedload(DirectChat.user_low),
+                 joinedload(Chat.direct).joinedload(DirectChat.user_high)) \
+        .order_by(Chat.last_activity.desc()).all()
+
+
+def chat_history(chat, before=None, after=None, limit=15):
+    """
+    метод выборки страницы сообщений чата по курсору
+
+    Страница ищется по индексу (chat_id, timestamp, id) от сообщения-курсора,
+    поэтому её стоимость не зависит от длины переписки.
+
+    :param chat: чат
+    :type chat: чат
+    :param before: id сообщения, до которого нужны более старые сообщения
+    :type before: число
+    :param after: id сообщения, после которого нужны более новые сообщения
+    :type after: число
+    :param limit: количество сообщений на странице
+    :type limit: число
+    :return: сообщения по возрастанию времени, есть ли более старые, есть ли более новые
+    """
+    key = tuple_(Post.timestamp, Post.id)
+    query = Post.query.options(joinedload(Post.author)).filter(Post.chat_id == chat.id)
+    cursor_id = after if after is not None else before
+    if cursor_id is not None:
+        cursor = Post.query.with_entities(Post.timestamp, Post.id) \
+            .filter(Post.chat_id == chat.id, Post.id == cursor_id).first()
+        if cursor is None:
+            return chat_history(chat, limit=limit)
+        cursor = tuple_(*cursor)
+    if after is not None:
+        posts = query.filter(key > cursor).order_by(Post.timestamp, Post.id).limit(limit + 1).all()
+        return posts[:limit], True, len(posts) > limit
+    if before is not None:
+        query = query.filter(key < cursor)
+    posts = query.order_by(Post.timestamp.desc(), Post.id.desc()).limit(limit + 1).all()
+    return posts[:limit][::-1], len(posts) > limit, before is not None
+
+
+def user_news(user, limit):
+    """
+    метод выборки последних новостей пользователя
+
+    :param user: автор новостей
+    :type user: пользователь
+    :param limit: количество новостей
+    :type limit: число
+    :return: список новостей, начиная с последней
+    """
+    return user.news.options(joinedload(News.author)) \
+        .order_by(News.timestamp.desc(), News.id.desc()).limit(limit).all()
+
+
+def feed_news(user, page, per_page):
+    """
+    метод выборки страницы ленты новостей пользователя
+
+    :param user: читатель
+    :type user: пользователь
+    :param page: номер страницы с 1
+    :type page: число
+    :param per_page: количество новостей на странице
+    :type per_page: число
+    :return: список новостей с авторами и есть ли следующая страница
+    """
+    news = News.query.options(joinedload(News.author)) \
+        .join(FeedItem, FeedItem.news_id == News.id) \
+        .filter(FeedItem.user_id == user.id) \
+        .order_by(FeedItem.timestamp.desc(), FeedItem.id.desc()) \
+        .offset((page - 1) * per_page).limit(per_page + 1).all()
+    return news[:per_page], len(news) > per_page
+
+
+def user_news_keys(user, limit):
+    """
+    метод выборки id и версий последних новостей пользователя без самих новостей
+
+    :param user: автор новостей
+    :type user: пользователь
+    :param limit: количество новостей
+    :type limit: число
+    :return: список пар (id, версия), начиная с последней новости
+    """
+    return db.session.query(News.id, News.version).filter(News.user_id == user.id) \
+        .order_by(News.timestamp.desc(), News.id.desc()).limit(limit).all()
+
+
+def feed_news_keys(user, page, per_page):
+    """
+    метод выборки id и версий новостей страницы ленты без самих новостей
+
+    :param user: читатель
+    :type user: пользователь
+    :param page: номер страницы с 1
+    :type page: число
+    :param per_page: количество новостей на странице
+    :type per_page: число
+    :return: список пар (id, версия) и есть ли следующая страница
+    """
+    keys = db.session.query(News.id, News.version) \
+        .join(FeedItem, FeedItem.news_id == News.id) \
+        .filter(FeedItem.user_id == user.id) \
+        .order_by(FeedItem.timestamp.desc(), FeedItem.id.desc()) \
+        .offset((page - 1) * per_page).limit(per_page + 1).all()
+    return keys[:per_page], len(keys) > per_page
+
+
+def news_by_ids(news_ids):
+    """
+    метод загрузки новостей с авторами в заданном порядке
+
+    :param news_ids: id новостей
+    :type news_ids: список чисел
+    :return: список новостей
+    """
+    if not news_ids:
+        return []
+    found = {news_item.id: news_item for news_item in
+             News.query.options(joinedload(News.author)).filter(News.id.in_(news_ids))}
+    return [found[news_id] for news_id in news_ids if news_id in found]
+
+
+def comments_for(news):
+    """
+    метод выборки комментариев к нескольким новостям одним запросом
+
+    :param news: новости
+    :type news: список новостей
+    :return: словарь id новости -> список комментариев с авторами
+    """
+    comments = defaultdict(list)
+    news_ids = [news_item.id for news_item in news]
+    if not news_ids:
+        return comments
+    query = Post.query.options(joinedload(Post.author)).filter(Post.news_id.in_(news_ids)) \
+        .order_by(Post.timestamp, Post.id)
+    for comment in query:
+        comments[comment.news_id].append(comment)
+    return comments
@@ -0,0 +1,240 @@
+"""
+модуль realtime
+
+Доставка новых сообщений чата открытым страницам через Server-Sent Events.
+Брокер выбирается настройкой REALTIME_BROKER:
+
+* inprocess - очереди в памяти процесса, подходит для одного процесса;
+* polling - опрос таблицы сообщений, работает при нескольких процессах gunicorn.
+  Таблицу опрашивает один поток на процесс одним запросом для всех открытых
+  чатов, поэтому открытые страницы не занимают соединения с бд.
+"""
+
+import json
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from flask import url_for
+from sqlalchemy import select
+from app import app, db
+from app.models import Post, User
+
+
+def post_payload(post_id, chat_id, body, timestamp, user_id, username, image_hash):
+    """
+    метод сборки компактного описания сообщения для клиента
+
+    :return: словарь с полями сообщения
+    """
+    avatar = None
+    if image_hash is not None:
+        avatar = url_for('image', kind='user', entity_id=user_id, size='avatar', digest=image_hash)
+    return {
+        'id': post_id,
+        'chat_id': chat_id,
+        'body': body,
+        'timestamp': timestamp.isoformat(),
+        'time': timestamp.strftime('%H:%M %d/%m'),
+        'author': {'id': user_id, 'username': username, 'avatar': avatar,
+                   'url': url_for('user', username=username)},
+    }
+
+
+def payload_for(post):
+    """
+    метод сборки описания сообщения по объекту сообщения
+
+    :param post: сообщение
+    :type post: сообщение
+    :return: словарь с полями сообщения
+    """
+    return post_payload(post.id, post.chat_id, post.body, post.timestamp, post.author.id,
+                        post.author.username, post.author.image_hash)
+
+
+def _posts_select():
+    post, user = Post.__table__, User.__table__
+    return select([post.c.id, post.c.chat_id, post.c.body, post.c.timestamp, user.c.id, user.c.username,
+                   user.c.image_hash]) \
+        .select_from(post.join(user, user.c.id == post.c.user_id))
+
+
+def posts_after(chat_id, last_id, limit=100):
+    """
+    метод выборки сообщений чата после указанного, отдельным соединением с бд
+
+    :param chat_id: id чата
+    :type chat_id: число
+    :param last_id: id последнего полученного сообщения
+    :type last_id: число
+    :param limit: наибольшее количество сообщений
+    :type limit: число
+    :return: список описаний сообщений
+    """
+    post = Post.__table__
+    query = _posts_select().where(post.c.chat_id == chat_id).where(post.c.id > last_id) \
+        .order_by(post.c.id).limit(limit)
+    with db.engine.connect() as connection:
+        return [post_payload(*row) for row in connection.execute(query)]
+
+
+def last_post_id(chat_id=None):
+    """
+    метод получения id последнего сообщения чата
+
+    :param chat_id: id чата или None для последнего сообщения всех чатов
+    :type chat_id: число
+    :return: id сообщения или 0
+    """
+    query = select([db.func.max(Post.__table__.c.id)])
+    if chat_id is not None:
+        query = query.where(Post.__table__.c.chat_id == chat_id)
+    with db.engine.connect() as connection:
+        return connection.execute(query).scalar() or 0
+
+
+class InProcessBroker(object):
+    """
+    брокер на очередях в памяти процесса
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues = defaultdict(set)
+
+    def publish(self, chat_id, payload):
+        self._deliver(chat_id, payload)
+
+    def _deliver(self, chat_id, item):
+        with self._lock:
+            subscribers = list(self._queues.get(chat_id, ()))
+        for subscriber in subscribers:
+            subscriber.put(item)
+
+    def unpack(self, item):
+        return item
+
+    def listen(self, chat_id, last_id, timeout):
+        """
+        метод ожидания новых сообщений чата
+
+        Отдаёт описания сообщений по мере публикации и None, если за timeout секунд
+        ничего не пришло.
+        """
+        subscriber = queue.Queue()
+        with self._lock:
+            self._queues[chat_id].add(subscriber)
+        try:
+            for payload in posts_after(chat_id, last_id):
+                last_id = payload['id']
+                yield payload
+            while True:
+                try:
+                    payload = self.unpack(subscriber.get(timeout=timeout))
+                except queue.Empty:
+                    yield None
+                    continue
+                if payload['id'] > last_id:
+                    last_id = payload['id']
+                    yield payload
+        finally:
+            with self._lock:
+                self._queues[chat_id].discard(subscriber)
+                if not self._queues[chat_id]:
+                    del self._queues[chat_id]
+
+
+class PollingBroker(InProcessBroker):
+    """
+    брокер, который опрашивает таблицу сообщений; публикация не нужна,
+    так как сообщение уже записано в бд
+
+    Один поток на процесс раз в interval секунд выбирает одним запросом новые
+    сообщения всех чатов, на которые есть подписчики, и раскладывает строки
+    по их очередям. Описания сообщений собираются уже в потоке запроса.
+    """
+
+    def __init__(self, interval, limit=100):
+        super(PollingBroker, self).__init__()
+        self.interval = interval
+        self.limit = limit
+        self._cursor = 0
+        self._poller = None
+
+    def publish(self, chat_id, payload):
+        pass
+
+    def unpack(self, item):
+        return post_payload(*item)
+
+    def listen(self, chat_id, last_id, timeout):
+        with self._lock:
+            if not self._queues:
+                # пока подписчиков не было, курсор не двигался
+                self._cursor = last_post_id()
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._run, name='realtime-poller', daemon=True)
+                self._poller.start()
+        yield from super(PollingBroker, self).listen(chat_id, last_id, timeout)
+
+    def _run(self):
+        with app.app_context():
+            while True:
+                time.sleep(self.interval)
+                try:
+                    while self.poll() == self.limit:
+                        pass
+                except Exception:
+                    app.logger.exception('realtime: ошибка опроса сообщений')
+
+    def poll(self):
+        """
+        метод выборки новых сообщений всех чатов с подписчиками
+
+        :return: количество выбранных сообщений
+        """
+        with self._lock:
+            chat_ids = list(self._queues)
+            cursor = self._cursor
+        if not chat_ids:
+            return 0
+        post = Post.__table__
+        query = _posts_select().where(post.c.id > cursor).where(post.c.chat_id.in_(chat_ids)) \
+            .order_by(post.c.id).limit(self.limit)
+        with db.engine.connect() as connection:
+            rows = [tuple(row) for row in connection.execute(query)]
+        if rows:
+            with self._lock:
+                self._cursor = max(self._cursor, rows[-1][0])
+        for row in rows:
+            self._deliver(row[1], row)
+        return len(rows)
+
+
+BROKERS = {
+    'inprocess': lambda config: InProcessBroker(),
+    'polling': lambda config: PollingBroker(config['REALTIME_POLL_INTERVAL']),
+}
+
+
+broker = BROKERS[app.config['REALTIME_BROKER']](app.config)
+
+
+def event_stream(chat_id, last_id):
+    """
+    метод формирования потока Server-Sent Events для чата
+
+    :param chat_id: id чата
+    :type chat_id: число
+    :param last_id: id последнего сообщения, которое уже есть у клиента
+    :type last_id: число
+    :return: генератор строк потока
+    """
+    yield 'retry: {}\n\n'.format(app.config['REALTIME_RETRY_MS'])
+    for payload in broker.listen(chat_id, last_id, app.config['REALTIME_KEEPALIVE']):
+        if payload is None:
+            yield ': keepalive\n\n'
+        else:
+            yield 'id: {}\nevent: message\ndata: {}\n\n'.format(payload['id'], json.dumps(payload))
@@ -0,0 +1,80 @@
+"""
+модуль replica
+
+Выбор бд для запроса к сайту, если настроена реплика (DATABASE_REPLICA_URL).
+GET и HEAD читают с реплики. Запросы, которые что-то записали, и все запросы
+того же пользователя в следующие REPLICA_STICKY_SECONDS секунд работают с
+основной бд, чтобы пользователь сразу видел свои изменения, даже если реплика
+отстаёт.
+"""
+
+import sqlite3
+import time
+
+from flask import g, request, session
+from app import app, db
+from app.sessions import REPLICA
+
+
+class ReplicaError(Exception):
+    """
+    ошибка работы с репликой
+    """
+    pass
+
+
+def is_configured():
+    return bool((app.config['SQLALCHEMY_BINDS'] or {}).get(REPLICA))
+
+
+def read_engine():
+    """
+    метод получения движка для чтения
+
+    :return: движок реплики, если она настроена, иначе основной бд
+    """
+    if is_configured():
+        return db.get_engine(app, bind=REPLICA)
+    return db.engine
+
+
+@app.before_request
+def choose_database():
+    g.db_read_replica = is_configured() and request.method in ('GET', 'HEAD') and \
+        session.get('db_primary_until', 0) < time.time()
+
+
+@app.after_request
+def remember_write(response):
+    """
+    метод закрепления пользователя за основной бд после записи
+
+    :param response: ответ
+    :type response: ответ
+    :return: ответ
+    """
+    if g.get('db_wrote') and is_configured():
+        session['db_primary_until'] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+    return response
+
+
+def sync():
+    """
+    метод копирования основной бд SQLite в файл реплики, чтобы проверять
+    работу с репликой на двух локальных файлах
+
+    :return: путь к файлу реплики
+    """
+    if not is_configured():
+        raise ReplicaError('реплика не настроена, задайте DATABASE_REPLICA_URL')
+    primary, replica = db.engine.url, read_engine().url
+    if primary.get_backend_name() != 'sqlite' or replica.get_backend_name() != 'sqlite':
+        raise ReplicaError('копировать можно только бд SQLite, серверная реплика обновляется самой бд')
+    source = sqlite3.connect(primary.database)
+    target = sqlite3.connect(replica.database)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    return replica.database
@@ -1,13 +1,15 @@
 # -*- coding: utf-8 -*-
-import sqlite3
-
-from flask import render_template, flash, redirect, url_for, request, make_response
+from flask import render_template, flash, redirect, url_for, request, make_response, abort, send_file, jsonify, \
+    Response, stream_with_context
 from werkzeug.urls import url_parse
 from app import app, db
 from app.forms import LoginForm, RegistrationForm, EditProfileForm, SearchAndCreateChatForm, SearchUserForm, PostForm,\
-    CreateNewsForm
+    CreateNewsForm, InviteUsersForm, InvitationsForm
 from flask_login import current_user, login_user
-from app.models import User, Chat, Post, Invitation, News
+from app.models import User, Chat, DirectChat, Post, News, ImageVariant, Job
+from sqlalchemy.exc import IntegrityError
+from app import feed, httpcache, images, invitations, jobs, membership, queries, realtime, presence, search, autocomplete, fragments
+from app.storage import store
 from flask_login import logout_user, login_required
 from datetime import datetime
 import pytz
@@ -23,11 +25,15 @@ def before_request():
     """
     метод определения времени последнего действия пользователя
 
+    Отметки копятся в памяти и записываются пачкой в фоновом потоке, поэтому чтение
+    страниц не превращается в запись в бд на каждом запросе.
+
     :return: ничего не возвращает
     """
+    if request.endpoint == 'static':
+        return
     if current_user.is_authenticated:
-        current_user.last_seen = datetime.now(pytz.timezone('Europe/Moscow'))
-        db.session.commit()
+        presence.tracker.touch(current_user)
 
 
 @app.route('/', methods=['GET', 'POST'])
@@ -43,8 +49,10 @@ def index():
     if form.validate_on_submit():
         if form.create_name.data == '':
             chat = Chat.query.filter_by(name=form.search_name.data).first()
-            if chat in current_user.chats:
+            if chat is not None and membership.is_member(current_user, chat.id):
                 return redirect(url_for('chat', chat_id=chat.id))
+            if form.search_name.data:
+                return redirect(url_for('search_results', q=form.search_name.data, kind='chat'))
         if form.search_name.data == '':
             chat = Chat.query.filter_by(name=form.create_name.data).first()
             if chat is None:
@@ -53,18 +61,15 @@ def index():
                 db.session.add(chat)
                 post = Post(body=f'{current_user.username} создал чат', author=current_user, chat=chat,
                             timestamp=datetime.now(pytz.timezone('Europe/Moscow')))
-                db.session.add(post)
+                chat.register_post(post)
                 db.session.commit()
                 flash('Поздравляю, вы создали новую беседу!')
                 return redirect(url_for('chat', chat_id=chat.id))
-    chats = current_user.chats
-    chats.sort(key=lambda x: x.posts[-1].timestamp)
-    invite = Invitation.query.filter_by(user=current_user).first()
-    if invite is None:
-        return render_template('index.html', title='Главная страница', chats=reversed(chats), count=0,
-                               form=form)
-    return render_template('index.html', title='Главная страница', chats=reversed(chats),
-                           invitations=current_user.invitations, count=1, form=form)
+    chats = queries.chat_list(current_user)
+    count = invitations.count_for(current_user)
+    return render_template('index.html', title='Главная страница', chats=chats, count=count,
+                           invitations=invitations.pending(current_user) if count else [],
+                           invitations_form=InvitationsForm(), form=form)
 
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -116,6 +121,7 @@ def register():
         user.set_password(form.password.data)
         db.session.add(user)
         db.session.commit()
+        autocomplete.index.add(user.id, user.username)
         flash('Поздравляю, теперь вы зарегистрированный пользователь!')
         return redirect(url_for('login'))
     return render_template('register.html', title='Регистрация', form=form)
@@ -132,9 +138,18 @@ def user(username):
     :return: страница профиля пользователя
     """
     user = User.query.filter_by(username=username).first_or_404()
-    chats = user.chats
-    news = user.news[::-1][:app.config['NEWS_PER_USER_PAGE']]
-    return render_template('user.html', user=user, chats=chats, news=news, title=user.username)
+    news_keys = queries.user_news_keys(user, app.config['NEWS_PER_USER_PAGE'])
+    last_seen = user.last_seen.strftime('%H:%M %d/%m') if user.last_seen else None
+    etag = httpcache.page_etag(['user.html', 'base.html', '_profile_news.html'], user.id, user.username,
+                               user.about_me, user.image_hash, last_seen,
+                               user != current_user and current_user.is_friend(user), news_keys)
+    response = httpcache.not_modified(etag)
+    if response is not None:
+        return response
+    news = queries.news_by_ids([news_id for news_id, version in news_keys])
+    return httpcache.with_etag(render_template(
+        'user.html', user=user, news_blocks=fragments.news_blocks('_profile_news.html', news, queries.comments_for),
+        title=user.username), etag)
 
 
 @app.route('/write_message/<username>')
@@ -148,21 +163,61 @@ def write_message(username):
     :return: переход на метод chat(name)
     """
     user = User.query.filter_by(username=username).first_or_404()
-    chat = Chat.query.filter_by(name='none'+user.username+current_user.username).first()
-    if chat is None:
-        chat = Chat.query.filter_by(name='none' + current_user.username + user.username).first()
-    if chat is None:
-        chat = Chat(name='none' + user.username + current_user.username)
+    low, high = DirectChat.key(current_user, user)
+    chat_id = db.session.query(DirectChat.chat_id).filter_by(user_low_id=low, user_high_id=high).scalar()
+    if chat_id is None:
+        chat = Chat()
         chat.users.append(current_user)
-        chat.users.append(user)
+        if user != current_user:
+            chat.users.append(user)
+        db.session.add(DirectChat(user_low_id=low, user_high_id=high, chat=chat))
         post = Post(body=f'{current_user.username} создал чат', author=current_user, chat=chat,
                     timestamp=datetime.now(pytz.timezone('Europe/Moscow')))
-        db.session.add(post)
-        db.session.commit()
-    return redirect(url_for('chat', chat_id=chat.id))
+        try:
+            chat.register_post(post)
+            db.session.commit()
+        except IntegrityError:
+            # переписку одновременно создал собеседник
+            db.session.rollback()
+            chat_id = db.session.query(DirectChat.chat_id).filter_by(user_low_id=low, user_high_id=high).scalar()
+        else:
+            chat_id = chat.id
+    return redirect(url_for('chat', chat_id=chat_id))
+
+
+def member_chat_or_abort(chat_id):
+    """
+    метод получения чата, в котором состоит текущий пользователь
+
+    :param chat_id: id чата
+    :type chat_id: число
+    :return: чат; 404, если чата нет, и 403, если пользователь в нём не состоит
+    """
+    if membership.is_member(current_user, chat_id):
+        return Chat.query.get_or_404(chat_id)
+    if Chat.query.get(chat_id) is None:
+        abort(404)
+    abort(403)
+
+
+def group_chat_or_abort(chat_id):
+    """
+    метод получения беседы, в которой состоит текущий пользователь
+
+    Личная переписка всегда остаётся парой, поэтому приглашать в неё и менять её
+    изображение нельзя.
+
+    :param chat_id: id чата
+    :type chat_id: число
+    :return: чат; 404, если чата нет, и 403, если пользователь в нём не состоит или это личная переписка
+    """
+    chat = member_chat_or_abort(chat_id)
+    if chat.direct is not None:
+        abort(403)
+    return chat
 
 
-@app.route('/chat/<chat_id>', methods=['GET'])
+@app.route('/chat/<int:chat_id>', methods=['GET'])
 @login_required
 def chat(chat_id):
     """
@@ -172,30 +227,61 @@ def chat(chat_id):
     :type chat_id: число
     :return: страница чата
     """
-    chat = Chat.query.filter_by(id=chat_id).first()
-    page = request.args.get('page', len(list(chat.posts)) // app.config['MESSAGES_PER_PAGE'] + 1, type=int)
-    posts = chat.posts.paginate(page, app.config['MESSAGES_PER_PAGE'], False)
-    next_url = url_for('chat', chat_id=chat_id, page=posts.next_num) \
-        if posts.has_next else None
-    prev_url = url_for('chat', chat_id=chat_id, page=posts.prev_num) \
-        if posts.has_prev else None
+    chat = member_chat_or_abort(chat_id)
+    if chat.mark_read(current_user):
+        db.session.commit()
+    posts, has_older, has_newer = queries.chat_history(chat, before=request.args.get('before', type=int),
+                                                       after=request.args.get('after', type=int),
+                                                       limit=app.config['MESSAGES_PER_PAGE'])
+    next_url = url_for('chat', chat_id=chat_id, after=posts[-1].id) \
+        if posts and has_newer else None
+    prev_url = url_for('chat', chat_id=chat_id, before=posts[0].id) \
+        if posts and has_older else None
     return render_template("chat.html", title='Home Page', chat=chat,
-                           posts=posts.items, next_url=next_url,
+                           posts=posts, next_url=next_url,
                            prev_url=prev_url)
 
 
-@app.route('/message/<chat_id>', methods=['POST'])
+@app.route('/message/<int:chat_id>', methods=['POST'])
 @login_required
 def message(chat_id):
     text = request.form.get('text')
-    chat = Chat.query.filter_by(id=chat_id).first()
+    chat = member_chat_or_abort(chat_id)
     post = Post(body=text, author=current_user, chat=chat,
                 timestamp=datetime.now(pytz.timezone('Europe/Moscow')))
-    db.session.add(post)
+    chat.register_post(post)
     db.session.commit()
+    payload = realtime.payload_for(post)
+    realtime.broker.publish(chat.id, payload)
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(payload), 201
     return redirect(url_for('chat', chat_id=chat_id))
 
 
+@app.route('/chat/<int:chat_id>/events')
+@login_required
+def chat_events(chat_id):
+    """
+    метод подписки на новые сообщения чата (Server-Sent Events)
+
+    :param chat_id: id чата
+    :type chat_id: число
+    :return: поток событий с новыми сообщениями
+    """
+    chat = member_chat_or_abort(chat_id)
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = request.args.get('last_id', type=int)
+    if last_id is None:
+        last_id = realtime.last_post_id(chat.id)
+    chat_id = chat.id
+    # поток живёт долго, поэтому соединение сессии возвращается в пул сразу
+    db.session.close()
+    return Response(stream_with_context(realtime.event_stream(chat_id, last_id)),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/edit_profile', methods=['GET', 'POST'])
 @login_required
 def edit_profile():
@@ -208,7 +294,9 @@ def edit_profile():
     if form.validate_on_submit():
         current_user.username = form.username.data
         current_user.about_me = form.about_me.data
+        current_user.bump_news_versions()
         db.session.commit()
+        autocomplete.index.add(current_user.id, current_user.username)
         flash('Ваши изменения были сохранены.')
         return redirect(url_for('user', username=current_user.username))
     elif request.method == 'GET':
@@ -218,62 +306,86 @@ def edit_profile():
                            form=form)
 
 
-@app.route('/invite_user/<chat_id>', methods=['GET', 'POST'])
+@app.route('/invite_user/<int:chat_id>', methods=['GET', 'POST'])
 @login_required
 def invite_user(chat_id):
     """
-    метод приглашения аользователя в чат
+    метод приглашения пользователей в чат, имена перечисляются через запятую
 
     :param chat_id: id чата
     :type chat_id: число
     :return: страница поиска пользователя или переход на метод chat(name)
     """
-    form = SearchUserForm()
-    chat = Chat.query.filter_by(id=chat_id).first()
+    form = InviteUsersForm()
+    chat = group_chat_or_abort(chat_id)
     if form.validate_on_submit():
-        user = User.query.filter_by(username=form.username.data).first()
-        if user is None:
-            flash('извините, пользователя с таким именем не существует')
+        usernames = invitations.parse_usernames(form.username.data)
+        try:
+            result = invitations.invite(chat, usernames)
+            db.session.commit()
+        except IntegrityError:
+            # тех же пользователей одновременно пригласил другой участник
+            db.session.rollback()
+            result = invitations.invite(chat, usernames)
+            db.session.commit()
+        if result.unknown:
+            flash('извините, пользователей с такими именами не существует: {}'.format(', '.join(result.unknown)))
+        if result.skipped:
+            flash('уже в чате или приглашены: {}'.format(', '.join(result.skipped)))
+        if not result.invited:
             return redirect(url_for('invite_user', chat_id=chat_id))
-        invitation = Invitation()
-        invitation.user = user
-        invitation.chat = chat
-        db.session.add(invitation)
-        db.session.commit()
-        flash('Поздравляю, вы приглосили нового пользователя!')
+        flash('Поздравляю, вы пригласили: {}!'.format(', '.join(result.invited)))
         return redirect(url_for('chat', chat_id=chat_id))
-    return render_template('search_user.html', title='Поиск беседы', form=form)
+    return render_template('search_user.html', title='Приглашение в беседу', form=form)
 
 
-@app.route('/accept_the_invitation/<invitation_id>')
+@app.route('/invitations', methods=['POST'])
+@login_required
+def answer_invitations():
+    """
+    метод принятия или отклонения выбранных приглашений
+
+    :return: переход на метод index()
+    """
+    form = InvitationsForm()
+    if form.validate_on_submit():
+        invitation_ids = request.form.getlist('invitation_id', type=int)
+        if form.accept.data:
+            invitations.accept(current_user, invitation_ids)
+        else:
+            invitations.decline(current_user, invitation_ids)
+        db.session.commit()
+    return redirect(url_for('index'))
+
+
+@app.route('/accept_the_invitation/<int:invitation_id>')
 @login_required
 def accept_the_invitation(invitation_id):
     """
     метод принятия приглашения
 
     :param invitation_id: id приглашения
-    :type invitation_id: строка
+    :type invitation_id: число
     :return: переход на метод index()
     """
-    invitation = Invitation.query.filter_by(id=int(invitation_id)).first()
-    current_user.chats.append(invitation.chat)
-    db.session.delete(invitation)
+    if not invitations.accept(current_user, [invitation_id]):
+        abort(404)
     db.session.commit()
     return redirect(url_for('index'))
 
 
-@app.route('/decline_the_invitation/<invitation_id>')
+@app.route('/decline_the_invitation/<int:invitation_id>')
 @login_required
 def decline_the_invitation(invitation_id):
     """
     метод отклонения приглашения
 
     :param invitation_id: id приглашения
-    :type invitation_id: строка
+    :type invitation_id: число
     :return: переход на метод index()
     """
-    invitation = Invitation.query.filter_by(id=int(invitation_id)).first()
-    db.session.delete(invitation)
+    if not invitations.decline(current_user, [invitation_id]):
+        abort(404)
     db.session.commit()
     return redirect(url_for('index'))
 
@@ -296,6 +408,7 @@ def follow(username):
         flash('Вы не можете подружиться с самим собой')
         return redirect(url_for('user', username=username))
     current_user.follow(user)
+    feed.link(current_user, user)
     db.session.commit()
     return redirect(url_for('user', username=username))
 
@@ -318,6 +431,7 @@ def unfollow(username):
         flash('Вы не можете подружиться с самим собой.')
         return redirect(url_for('user', username=username))
     current_user.unfollow(user)
+    feed.unlink(current_user, user)
     db.session.commit()
     return redirect(url_for('user', username=username))
 
@@ -330,44 +444,128 @@ def list_of_friends():
 
     :return: страница списка друзей
     """
-    users = User.query.all()
-    followers = []
-    followed = []
-    for user in users:
-        if user.is_following(current_user):
-            followers.append(user)
-        elif current_user.is_following(user):
-            followed.append(user)
+    friends = current_user.friends()
+    mutual_ids = {user.id for user in friends.mutual}
+    followers = friends.followers
+    followed = [user for user in friends.followed if user.id not in mutual_ids]
     form = SearchUserForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
         if user is None:
-            flash('извините, пользователя с таким именем не существует')
-            return redirect(url_for('list_of_friends'))
+            return redirect(url_for('search_results', q=form.username.data, kind='user'))
         return redirect(url_for('user', username=user.username))
     return render_template('list_of_friends.html', title='Список друзей', followers=followers, followed=followed,
                            form=form)
 
 
+def redirect_to_job(location, job_id):
+    """
+    метод перенаправления после постановки фоновой задачи
+
+    Адрес состояния задачи передаётся в заголовке X-Job.
+
+    :param location: куда перенаправить
+    :type location: строка
+    :param job_id: id задачи
+    :type job_id: число
+    :return: ответ с перенаправлением
+    """
+    response = redirect(location)
+    response.headers['X-Job'] = url_for('job_status', job_id=job_id)
+    return response
+
+
 @app.route('/upload', methods=['POST'])
 @login_required
 def upload():
-    file = request.files['file']
-    img = file.read()
-    current_user.image = sqlite3.Binary(img)
+    file = request.files['file'].stream
+    try:
+        job = images.attach_later('user', current_user, file, user=current_user)
+    except images.ImageError:
+        flash('Не удалось прочитать изображение, выберите другой файл.')
+        return redirect(url_for('user', username=current_user.username))
+    job_id = job.id
     db.session.commit()
-    return redirect(url_for('user', username=current_user.username))
+    return redirect_to_job(url_for('user', username=current_user.username), job_id)
 
 
-@app.route('/upload_chat_image/<chat_id>', methods=['POST'])
+@app.route('/upload_chat_image/<int:chat_id>', methods=['POST'])
 @login_required
 def upload_chat_image(chat_id):
-    file = request.files['file']
-    img = file.read()
-    chat = Chat.query.filter_by(id=chat_id).first()
-    chat.image = sqlite3.Binary(img)
+    chat = group_chat_or_abort(chat_id)
+    file = request.files['file'].stream
+    try:
+        job = images.attach_later('chat', chat, file, user=current_user)
+    except images.ImageError:
+        flash('Не удалось прочитать изображение, выберите другой файл.')
+        return redirect(url_for('chat', chat_id=chat_id))
+    job_id = job.id
     db.session.commit()
-    return redirect(url_for('chat', chat_id=chat_id))
+    return redirect_to_job(url_for('chat', chat_id=chat_id), job_id)
+
+
+IMAGE_MODELS = images.MODELS
+
+
+@app.route('/image/<kind>/<int:entity_id>/<size>/<digest>')
+def image(kind, entity_id, size, digest):
+    """
+    метод отдачи изображения пользователя, чата или новости нужного размера
+
+    Адрес содержит хэш содержимого, поэтому ответ кэшируется браузером без ограничения
+    по времени, а при смене изображения меняется и адрес. Адрес с устаревшим или чужим хэшем
+    получает 404. Изображение чата видно только его участникам и не кэшируется прокси.
+
+    :param kind: тип объекта (user, chat или news)
+    :type kind: строка
+    :param entity_id: id объекта
+    :type entity_id: число
+    :param size: размер изображения (avatar, profile или news)
+    :type size: строка
+    :param digest: хэш изображения
+    :type digest: строка
+    :return: изображение
+    """
+    model = IMAGE_MODELS.get(kind)
+    if model is None or size not in images.SIZES:
+        abort(404)
+    if kind == 'chat':
+        if not current_user.is_authenticated:
+            return app.login_manager.unauthorized()
+        if not membership.is_member(current_user, entity_id):
+            abort(404)
+        scope = 'private'
+    else:
+        scope = 'public'
+    etag = '{}-{}'.format(digest, size)
+    cache_control = '{}, max-age={}, immutable'.format(scope, app.config['IMAGE_CACHE_MAX_AGE'])
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        return response
+    image_hash = db.session.query(model.image_hash).filter(model.id == entity_id).scalar()
+    if image_hash is None or image_hash != digest:
+        abort(404)
+    variant = db.session.query(ImageVariant.mimetype, ImageVariant.digest) \
+        .filter_by(source_hash=digest, size=size).first()
+    if variant is not None:
+        blob = store.open(variant.digest)
+        mimetype = variant.mimetype
+    else:
+        # изображение загружено до появления размеров и ещё не обработано `flask images rebuild`
+        blob = store.open(digest)
+        mimetype = None
+        if blob is not None:
+            mimetype = images.guess_mimetype(blob.read(12))
+            blob.seek(0)
+    if blob is None:
+        abort(404)
+    response = send_file(blob, mimetype=mimetype, add_etags=False, conditional=False,
+                         cache_timeout=app.config['IMAGE_CACHE_MAX_AGE'])
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
 
 
 @app.route('/create_news', methods=['GET', 'POST'])
@@ -378,6 +576,8 @@ def create_news():
         news = News(text=form.text.data, timestamp=datetime.now(pytz.timezone('Europe/Moscow')),
                     user_id=current_user.id)
         db.session.add(news)
+        db.session.flush()
+        jobs.enqueue('feed.fan_out', user=current_user, news_id=news.id)
         db.session.commit()
         return render_template('set_news_image.html', title='Выбор изображения', news_id=news.id)
     return render_template('create_news.html', title='Создание новости', form=form)
@@ -391,6 +591,7 @@ def comment(username, news_id):
     post = Post(body=text, author=current_user, news=news,
                 timestamp=datetime.now(pytz.timezone('Europe/Moscow')))
     db.session.add(post)
+    news.bump_version()
     db.session.commit()
     return redirect(url_for('user', username=username))
 
@@ -403,6 +604,7 @@ def comment_from_news(username, news_id):
     post = Post(body=text, author=current_user, news=news,
                 timestamp=datetime.now(pytz.timezone('Europe/Moscow')))
     db.session.add(post)
+    news.bump_version()
     db.session.commit()
     return redirect(url_for('news'))
 
@@ -410,12 +612,16 @@ def comment_from_news(username, news_id):
 @app.route('/upload_news_image/<news_id>', methods=['POST'])
 @login_required
 def upload_news_image(news_id):
-    file = request.files['file']
-    img = file.read()
+    file = request.files['file'].stream
     news = News.query.filter_by(id=news_id).first()
-    news.image = sqlite3.Binary(img)
+    try:
+        job = images.attach_later('news', news, file, user=current_user)
+    except images.ImageError:
+        flash('Не удалось прочитать изображение, выберите другой файл.')
+        return redirect(url_for('user', username=current_user.username))
+    job_id = job.id
     db.session.commit()
-    return redirect(url_for('user', username=current_user.username))
+    return redirect_to_job(url_for('user', username=current_user.username), job_id)
 
 
 @app.route('/news')
@@ -426,18 +632,80 @@ def news():
 
     :return: страница новостей
     """
-    news = []
-    users = User.query.all()
-    followers = []
-    followed = []
-    for user in users:
-        if user.is_following(current_user):
-            followers.append(user)
-        elif current_user.is_following(user):
-            followed.append(user)
-    for follower in followers:
-        news += follower.news
-    for follower in followed:
-        news += follower.news
-    news.sort(key=lambda x: x.timestamp)
-    return render_template('news.html', title='Новости', news=news[::-1][:app.config['NEWS_PER_PAGE']])
+    page = request.args.get('page', 1, type=int)
+    per_page = app.config['NEWS_PER_PAGE']
+    news_keys, has_next = queries.feed_news_keys(current_user, page, per_page)
+    etag = httpcache.page_etag(['news.html', 'base.html', '_feed_news.html'], page, has_next, news_keys)
+    response = httpcache.not_modified(etag)
+    if response is not None:
+        return response
+    news = queries.news_by_ids([news_id for news_id, version in news_keys])
+    next_url = url_for('news', page=page + 1) if has_next else None
+    prev_url = url_for('news', page=page - 1) if page > 1 else None
+    return httpcache.with_etag(render_template(
+        'news.html', title='Новости', news_blocks=fragments.news_blocks('_feed_news.html', news, queries.comments_for),
+        next_url=next_url, prev_url=prev_url), etag)
+
+
+@app.route('/search')
+@login_required
+def search_results():
+    """
+    метод отбражения страницы поиска по пользователям, чатам, новостям и сообщениям
+
+    :return: страница результатов поиска
+    """
+    query = request.args.get('q', '')
+    kind = request.args.get('kind')
+    if kind not in search.KINDS:
+        kind = None
+    page = max(request.args.get('page', 1, type=int), 1)
+    results, has_next = search.search(current_user, query, kind, page, app.config['SEARCH_PER_PAGE'])
+    next_url = url_for('search_results', q=query, kind=kind, page=page + 1) if has_next else None
+    prev_url = url_for('search_results', q=query, kind=kind, page=page - 1) if page > 1 else None
+    return render_template('search.html', title='Поиск', query=query, kind=kind, results=results,
+                           next_url=next_url, prev_url=prev_url)
+
+
+@app.route('/autocomplete/users')
+@login_required
+def autocomplete_users():
+    """
+    метод подсказки имён пользователей по началу имени, друзья идут первыми
+
+    :return: список пользователей в формате json
+    """
+    prefix = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', app.config['AUTOCOMPLETE_LIMIT'], type=int), 1), 50)
+    if not prefix:
+        return jsonify([])
+    friends = feed.friend_ids(current_user.id)
+    matches = autocomplete.index.complete(prefix, limit, preferred=friends, exclude=current_user.id)
+    return jsonify([{'id': user_id, 'username': username, 'friend': user_id in friends,
+                     'url': url_for('user', username=username)} for user_id, username in matches])
+
+
+@app.route('/jobs')
+@login_required
+def user_jobs():
+    """
+    метод получения последних фоновых задач пользователя
+
+    :return: список задач в формате json
+    """
+    user_jobs = Job.query.filter_by(user_id=current_user.id).order_by(Job.id.desc()).limit(20)
+    return jsonify([job.to_dict() for job in user_jobs])
+
+
+@app.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    """
+    метод получения состояния фоновой задачи пользователя
+
+    :param job_id: id задачи
+    :type job_id: число
+    :return: состояние задачи в формате json
+    """
+    job = Job.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    return jsonify(job.to_dict())
@@ -0,0 +1,249 @@
+"""
+модуль search
+
+Полнотекстовый поиск по пользователям, чатам, новостям и сообщениям чатов.
+В SQLite для каждого вида есть таблица FTS5 (search_user, search_chat,
+search_news, search_post), rowid которой совпадает с id объекта. Таблицы
+обновляются после каждого flush сессии, поэтому индекс не отстаёт от данных.
+Слова запроса ищутся по префиксу, результаты упорядочены по bm25.
+В других бд поиск выполняется через LIKE без ранжирования.
+
+Сообщения и чаты ищутся только среди чатов, в которых состоит пользователь,
+личные переписки в поиске чатов не показываются.
+"""
+
+import re
+from collections import namedtuple
+
+from sqlalchemy import event, or_, and_, text
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import User, Chat, News, Post, user_chats
+
+
+Kind = namedtuple('Kind', ['model', 'table', 'columns', 'weights'])
+
+# вид -> модель, таблица FTS5, индексируемые поля и их вес в bm25
+KINDS = {
+    'user': Kind(User, 'search_user', ('username', 'about_me'), (4.0, 1.0)),
+    'chat': Kind(Chat, 'search_chat', ('name',), (1.0,)),
+    'news': Kind(News, 'search_news', ('text',), (1.0,)),
+    'post': Kind(Post, 'search_post', ('body',), (1.0,)),
+}
+
+MAX_TERMS = 8
+
+
+def create_statements():
+    """
+    метод получения команд создания таблиц FTS5
+
+    :return: список sql-команд
+    """
+    statements = []
+    for name, kind in KINDS.items():
+        columns = list(kind.columns) + (['chat_id UNINDEXED'] if name == 'post' else [])
+        statements.append("CREATE VIRTUAL TABLE IF NOT EXISTS {} USING fts5({}, tokenize='unicode61 "
+                          "remove_diacritics 2')".format(kind.table, ', '.join(columns)))
+    return statements
+
+
+def fill_statements():
+    """
+    метод получения команд заполнения таблиц FTS5 по текущим данным
+
+    :return: список sql-команд
+    """
+    return [
+        "INSERT INTO search_user (rowid, username, about_me) "
+        "SELECT id, coalesce(username, ''), coalesce(about_me, '') FROM user",
+        "INSERT INTO search_chat (rowid, name) SELECT id, coalesce(name, '') FROM chat",
+        "INSERT INTO search_news (rowid, text) SELECT id, coalesce(text, '') FROM news",
+        "INSERT INTO search_post (rowid, body, chat_id) "
+        "SELECT id, coalesce(body, ''), chat_id FROM post WHERE chat_id IS NOT NULL",
+    ]
+
+
+def is_supported(bind):
+    return bind.dialect.name == 'sqlite'
+
+
+def terms(query):
+    """
+    метод разбора строки поиска на слова
+
+    :param query: строка поиска
+    :type query: строка
+    :return: список слов в нижнем регистре
+    """
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def match_expression(words):
+    """
+    метод составления выражения MATCH: все слова по префиксу
+
+    :param words: слова запроса
+    :type words: список строк
+    :return: выражение для FTS5
+    """
+    return ' '.join('"{}"*'.format(word) for word in words)
+
+
+def _indexed(kind_name, entity):
+    return kind_name != 'post' or entity.chat_id is not None
+
+
+def _values(kind, entity):
+    return {column: getattr(entity, column) or '' for column in kind.columns}
+
+
+@event.listens_for(db.session, 'after_flush')
+def update_index(session, flush_context):
+    """
+    метод обновления таблиц поиска по объектам, записанным при flush
+
+    :return: ничего не возвращает
+    """
+    connection = session.connection()
+    if not is_supported(connection):
+        return
+    for kind_name, kind in KINDS.items():
+        removed, written = [], []
+        for entity in session.deleted:
+            if isinstance(entity, kind.model):
+                removed.append(entity.id)
+        for entity in session.new:
+            if isinstance(entity, kind.model) and _indexed(kind_name, entity):
+                written.append(entity)
+        for entity in session.dirty:
+            if not isinstance(entity, kind.model):
+                continue
+            state = db.inspect(entity)
+            columns = kind.columns + (('chat_id',) if kind_name == 'post' else ())
+            if any(state.attrs[column].history.has_changes() for column in columns):
+                removed.append(entity.id)
+                if _indexed(kind_name, entity):
+                    written.append(entity)
+        if removed:
+            connection.execute(text('DELETE FROM {} WHERE rowid = :id'.format(kind.table)),
+                               [{'id': entity_id} for entity_id in removed])
+        if written:
+            columns = ('rowid',) + kind.columns + (('chat_id',) if kind_name == 'post' else ())
+            statement = 'INSERT INTO {} ({}) VALUES ({})'.format(
+                kind.table, ', '.join(columns), ', '.join(':' + column for column in columns))
+            connection.execute(text(statement), [
+                dict(_values(kind, entity), rowid=entity.id, chat_id=getattr(entity, 'chat_id', None))
+                for entity in written
+            ])
+
+
+def rebuild():
+    """
+    метод полной пересборки таблиц поиска, например после массовой загрузки данных
+
+    :return: количество проиндексированных объектов или None, если бд не поддерживает FTS5
+    """
+    if not is_supported(db.session.connection()):
+        return None
+    for statement in create_statements():
+        db.session.execute(statement)
+    for kind in KINDS.values():
+        db.session.execute('DELETE FROM {}'.format(kind.table))
+    for statement in fill_statements():
+        db.session.execute(statement)
+    db.session.commit()
+    return sum(db.session.execute('SELECT count(*) FROM {}'.format(kind.table)).scalar()
+               for kind in KINDS.values())
+
+
+def _member_chats(user):
+    return db.session.query(user_chats.c.chat_id).filter(user_chats.c.user_id == user.id)
+
+
+def _ranked(user, words, kinds, limit, offset):
+    """
+    метод поиска по таблицам FTS5
+
+    :return: список пар (вид, id) по убыванию релевантности
+    """
+    parts = []
+    for kind_name in kinds:
+        kind = KINDS[kind_name]
+        part = "SELECT '{name}' AS kind, rowid AS id, bm25({table}, {weights}) AS score FROM {table} " \
+               "WHERE {table} MATCH :query".format(name=kind_name, table=kind.table,
+                                                   weights=', '.join(str(w) for w in kind.weights))
+        if kind_name == 'chat':
+            part += ' AND rowid IN (SELECT chat_id FROM user_chats WHERE user_id = :user_id)' \
+                    ' AND rowid NOT IN (SELECT chat_id FROM direct_chat)'
+        if kind_name == 'post':
+            part += ' AND chat_id IN (SELECT chat_id FROM user_chats WHERE user_id = :user_id)'
+        parts.append(part)
+    statement = ' UNION ALL '.join(parts) + ' ORDER BY score, id DESC LIMIT :limit OFFSET :offset'
+    rows = db.session.execute(statement, {'query': match_expression(words), 'user_id': user.id,
+                                          'limit': limit, 'offset': offset})
+    return [(kind_name, entity_id) for kind_name, entity_id, score in rows]
+
+
+def _like(user, words, kinds, limit, offset):
+    """
+    метод поиска через LIKE для бд без FTS5: все слова должны встретиться
+    в одном из полей, новые объекты выше
+
+    :return: список пар (вид, id)
+    """
+    found = []
+    for kind_name in kinds:
+        kind = KINDS[kind_name]
+        model = kind.model
+        query = db.session.query(model.id).filter(and_(*[
+            or_(*[getattr(model, column).ilike('%{}%'.format(word)) for column in kind.columns])
+            for word in words
+        ]))
+        if kind_name == 'chat':
+            query = query.filter(model.id.in_(_member_chats(user)), ~model.direct.has())
+        if kind_name == 'post':
+            query = query.filter(model.chat_id.in_(_member_chats(user)))
+        found.extend((kind_name, entity_id) for entity_id, in
+                     query.order_by(model.id.desc()).limit(offset + limit))
+    return found[offset:offset + limit]
+
+
+def search(user, query, kind=None, page=1, per_page=20):
+    """
+    метод поиска от имени пользователя
+
+    :param user: пользователь, который ищет
+    :type user: пользователь
+    :param query: строка поиска
+    :type query: строка
+    :param kind: вид результатов из KINDS или None для всех видов
+    :type kind: строка
+    :param page: номер страницы с 1
+    :type page: число
+    :param per_page: количество результатов на странице
+    :type per_page: число
+    :return: список пар (вид, объект) и есть ли следующая страница
+    """
+    words = terms(query)
+    if not words:
+        return [], False
+    kinds = [kind] if kind in KINDS else list(KINDS)
+    find = _ranked if is_supported(db.session.connection()) else _like
+    found = find(user, words, kinds, per_page + 1, (page - 1) * per_page)
+    has_next = len(found) > per_page
+    found = found[:per_page]
+    entities = {}
+    for kind_name in kinds:
+        ids = [entity_id for found_kind, entity_id in found if found_kind == kind_name]
+        if not ids:
+            continue
+        model = KINDS[kind_name].model
+        query = model.query.filter(model.id.in_(ids))
+        if kind_name in ('news', 'post'):
+            query = query.options(joinedload(model.author))
+        if kind_name == 'post':
+            query = query.options(joinedload(Post.chat))
+        entities.update(((kind_name, entity.id), entity) for entity in query)
+    return [(kind_name, entities[kind_name, entity_id]) for kind_name, entity_id in found
+            if (kind_name, entity_id) in entities], has_next
@@ -0,0 +1,61 @@
+"""
+модуль sessions
+
+Сессия, которая отправляет чтение на реплику бд, если она настроена
+(SQLALCHEMY_BINDS['replica']), а запись - на основную бд. Чтение идёт на
+реплику только в запросах к сайту, которые модуль replica разрешил
+(GET без недавней записи этого пользователя) и пока в них ничего не
+записывалось; всё остальное работает с основной бд.
+"""
+
+from flask import g, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm
+from sqlalchemy.sql.expression import UpdateBase, TextClause
+
+REPLICA = 'replica'
+
+_WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'DROP', 'ALTER', 'PRAGMA')
+
+
+def is_write(clause):
+    """
+    метод проверки, что выражение изменяет данные
+
+    :param clause: выражение sqlalchemy
+    :type clause: выражение
+    :return: True или False
+    """
+    if isinstance(clause, UpdateBase):
+        return True
+    if isinstance(clause, TextClause):
+        return clause.text.lstrip().upper().startswith(_WRITE_PREFIXES)
+    return False
+
+
+class RoutingSession(SignallingSession):
+    """
+    сессия с выбором между основной бд и репликой
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        if has_request_context():
+            if self._flushing or is_write(clause):
+                # с этого момента запрос должен видеть свою запись
+                g.db_read_replica = False
+                g.db_wrote = True
+            elif g.get('db_read_replica'):
+                return self.replica_engine()
+        return SignallingSession.get_bind(self, mapper, clause)
+
+    def replica_engine(self):
+        return self.app.extensions['sqlalchemy'].db.get_engine(self.app, bind=REPLICA)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """
+    SQLAlchemy с сессией RoutingSession
+    """
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
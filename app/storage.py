@@ -0,0 +1,154 @@
+"""
+модуль storage
+
+Хранилище двоичных данных с адресацией по содержимому: ключом служит sha256
+данных, поэтому одинаковые файлы хранятся один раз, а строки таблиц держат
+только хэш.
+"""
+
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from hashlib import sha256
+
+from app import app
+
+
+class BlobStore(ABC):
+    """
+    базовый класс хранилища
+    """
+
+    @abstractmethod
+    def put(self, data):
+        """
+        метод сохранения данных
+
+        :param data: данные
+        :type data: байты
+        :return: хэш данных, по которому их можно получить
+        """
+
+    def put_file(self, upload):
+        """
+        метод сохранения принятого файла загрузки
+
+        :param upload: временный файл загрузки с посчитанным хэшем
+        :type upload: uploads.SpooledUpload
+        :return: хэш данных
+        """
+        upload.seek(0)
+        return self.put(upload.read())
+
+    def spool_directory(self):
+        """
+        метод получения каталога для временных файлов загрузок
+
+        :return: путь или None для системного временного каталога
+        """
+        return None
+
+    @abstractmethod
+    def open(self, digest):
+        """
+        метод открытия данных на чтение
+
+        :param digest: хэш данных
+        :type digest: строка
+        :return: файловый объект или None, если данных нет
+        """
+
+    def get(self, digest):
+        """
+        метод чтения данных целиком
+
+        :param digest: хэш данных
+        :type digest: строка
+        :return: данные или None, если данных нет
+        """
+        blob = self.open(digest)
+        if blob is None:
+            return None
+        with blob:
+            return blob.read()
+
+    @abstractmethod
+    def exists(self, digest):
+        """
+        метод проверки наличия данных
+
+        :param digest: хэш данных
+        :type digest: строка
+        :return: True или False
+        """
+
+
+class FileSystemBlobStore(BlobStore):
+    """
+    хранилище в каталоге на диске: файл <root>/ab/cd/abcd...
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def put(self, data):
+        digest = sha256(data).hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            return digest
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return digest
+
+    def put_file(self, upload):
+        # временный файл лежит в том же каталоге хранилища, поэтому переносится без копирования
+        digest = upload.hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        upload.flush()
+        os.replace(upload.name, path)
+        return digest
+
+    def spool_directory(self):
+        return os.path.join(self.root, 'tmp')
+
+    def open(self, digest):
+        try:
+            return open(self.path(digest), 'rb')
+        except FileNotFoundError:
+            return None
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+
+BACKENDS = {
+    'filesystem': lambda config: FileSystemBlobStore(config['BLOB_STORE_PATH']),
+}
+
+
+def create_store(config):
+    """
+    метод создания хранилища по настройкам приложения
+
+    :param config: настройки приложения
+    :type config: словарь
+    :return: хранилище
+    """
+    return BACKENDS[config['BLOB_STORE']](config)
+
+
+store = create_store(app.config)
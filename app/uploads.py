@@ -0,0 +1,107 @@
+"""
+модуль uploads
+
+Приём загружаемых файлов без чтения их в память. Файлы из multipart-запроса
+записываются кусками во временный файл рядом с хранилищем, по пути считается
+sha256, а готовый файл переносится в хранилище переименованием.
+
+Общий размер запроса ограничен MAX_CONTENT_LENGTH, размер файла - UPLOAD_LIMITS
+по его типу: во время приёма по типу, который прислал браузер, а после приёма
+по типу, определённому по содержимому. Превышение прерывает приём с ошибкой 413.
+"""
+
+import os
+import tempfile
+from hashlib import sha256
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+from app import app
+from app.storage import store
+
+
+class UploadTooLarge(RequestEntityTooLarge):
+    """
+    файл больше ограничения для своего типа
+    """
+    pass
+
+
+def limit_for(mimetype):
+    """
+    метод получения наибольшего размера файла для типа
+
+    :param mimetype: mime-тип файла
+    :type mimetype: строка
+    :return: размер в байтах или None без ограничения
+    """
+    return app.config['UPLOAD_LIMITS'].get(mimetype, app.config['MAX_CONTENT_LENGTH'])
+
+
+class SpooledUpload(object):
+    """
+    временный файл загрузки, который считает sha256 и размер по мере записи
+    """
+
+    def __init__(self, directory, limit):
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        fd, self.name = tempfile.mkstemp(dir=directory, prefix='upload-')
+        self.file = os.fdopen(fd, 'w+b')
+        self.limit = limit
+        self.size = 0
+        self._hash = sha256()
+
+    def write(self, data):
+        self.size += len(data)
+        if self.limit is not None and self.size > self.limit:
+            raise UploadTooLarge()
+        self._hash.update(data)
+        return self.file.write(data)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    def check_limit(self, mimetype):
+        """
+        метод проверки размера по типу, определённому по содержимому
+
+        :param mimetype: mime-тип файла
+        :type mimetype: строка
+        :return: ничего не возвращает
+        """
+        limit = limit_for(mimetype)
+        if limit is not None and self.size > limit:
+            raise UploadTooLarge()
+
+    def close(self):
+        self.file.close()
+        try:
+            os.unlink(self.name)
+        except FileNotFoundError:
+            # файл уже перенесён в хранилище
+            pass
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+class UploadRequest(Request):
+    """
+    запрос, файлы которого принимаются в SpooledUpload
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        upload = SpooledUpload(store.spool_directory(), limit_for(content_type))
+        self.__dict__.setdefault('_uploads', []).append(upload)
+        return upload
+
+    def close(self):
+        try:
+            Request.close(self)
+        finally:
+            for upload in self.__dict__.pop('_uploads', ()):
+                upload.close()
+
+
+app.request_class = UploadRequest
@@ -0,0 +1,119 @@
+"""
+модуль usercache
+
+Загрузка пользователя для Flask-Login без запроса к бд на каждом запросе.
+Значения полей пользователя хранятся в LRU в памяти процесса на
+USER_CACHE_SIZE пользователей не дольше USER_CACHE_TTL секунд, а объект
+пользователя собирается из них и добавляется в сессию без запроса.
+Отношения (подписки, чаты, новости) по-прежнему загружаются из бд при обращении.
+
+Запись пользователя запоминается при flush сессии и сбрасывает его из кэша
+после commit, поэтому смена имени, описания, изображения и подписок видна
+сразу. Изменения из других процессов видны через USER_CACHE_TTL секунд.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+from app import app, db, login
+from app.models import User
+
+COLUMNS = [column.key for column in db.inspect(User).column_attrs]
+
+
+class UserCache(object):
+    """
+    LRU значений полей пользователей с ограничением по времени
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, user_id):
+        """
+        метод получения значений полей пользователя
+
+        :param user_id: id пользователя
+        :type user_id: число
+        :return: словарь поле -> значение или None, если записи нет или она устарела
+        """
+        with self._lock:
+            item = self._items.get(user_id)
+            if item is None:
+                return None
+            loaded, values = item
+            if time.monotonic() - loaded > self.ttl:
+                del self._items[user_id]
+                return None
+            self._items.move_to_end(user_id)
+            return values
+
+    def set(self, user_id, values):
+        with self._lock:
+            self._items[user_id] = (time.monotonic(), values)
+            self._items.move_to_end(user_id)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, user_ids):
+        """
+        метод удаления пользователей из кэша
+
+        :param user_ids: id пользователей
+        :type user_ids: список чисел
+        :return: ничего не возвращает
+        """
+        with self._lock:
+            for user_id in user_ids:
+                self._items.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+cache = UserCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+
+
+@login.user_loader
+def load_user(id):
+    """
+    метод загрузки пользователя по id из сессии Flask-Login
+
+    :param id: id пользователя
+    :type id: строка
+    :return: пользователь или None
+    """
+    user_id = int(id)
+    values = cache.get(user_id)
+    if values is None:
+        user = User.query.get(user_id)
+        if user is not None:
+            cache.set(user_id, {column: getattr(user, column) for column in COLUMNS})
+        return user
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+@event.listens_for(db.session, 'after_flush')
+def remember_changed(session, flush_context):
+    changed = [entity.id for entity in session.dirty | session.deleted if isinstance(entity, User)]
+    if changed:
+        session.info.setdefault('changed_users', set()).update(changed)
+
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_changed(session):
+    cache.invalidate(session.info.pop('changed_users', ()))
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def forget_changed(session, previous_transaction):
+    cache.invalidate(session.info.pop('changed_users', ()))
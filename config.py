@@ -3,10 +3,105 @@ import os
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 
+def gevent_patched():
+    """
+    метод проверки, что процесс работает под gevent (например, gunicorn -k gevent)
+
+    :return: True или False
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+def engine_options(uri):
+    """
+    метод получения настроек движка sqlalchemy для адреса бд
+
+    SQLite работает в режиме WAL: читатели не ждут писателя, а писатели ждут
+    друг друга до SQLITE_BUSY_TIMEOUT секунд. Ожидание блокировки в SQLite не
+    отдаёт управление другим greenlet, поэтому под gevent у процесса одно
+    соединение, очередь к которому переключает greenlet. Для серверных бд
+    настраивается пул соединений.
+
+    :param uri: адрес бд
+    :type uri: строка
+    :return: словарь для SQLALCHEMY_ENGINE_OPTIONS
+    """
+    if uri.startswith('sqlite'):
+        if uri in ('sqlite://', 'sqlite:///:memory:'):
+            return {}
+        from sqlalchemy.pool import QueuePool
+        gevent = gevent_patched()
+        return {
+            'poolclass': QueuePool,
+            'pool_size': 1 if gevent else int(os.environ.get('DATABASE_POOL_SIZE') or 5),
+            'max_overflow': 0 if gevent else int(os.environ.get('DATABASE_MAX_OVERFLOW') or 10),
+            'pool_timeout': int(os.environ.get('DATABASE_POOL_TIMEOUT') or 30),
+            'connect_args': {'check_same_thread': False,
+                             'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 30)},
+        }
+    return {
+        'pool_size': int(os.environ.get('DATABASE_POOL_SIZE') or 10),
+        'max_overflow': int(os.environ.get('DATABASE_MAX_OVERFLOW') or 20),
+        'pool_timeout': int(os.environ.get('DATABASE_POOL_TIMEOUT') or 30),
+        'pool_recycle': int(os.environ.get('DATABASE_POOL_RECYCLE') or 1800),
+        'pool_pre_ping': True,
+    }
+
+
 class Config(object):
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'services-of-funeral-services'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_BINDS = {'replica': os.environ['DATABASE_REPLICA_URL']} \
+        if os.environ.get('DATABASE_REPLICA_URL') else None
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS') or 5)
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL'
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL'
     MESSAGES_PER_PAGE = 15
     NEWS_PER_USER_PAGE = 5
     NEWS_PER_PAGE = 50
+    SEARCH_PER_PAGE = 20
+    AUTOCOMPLETE_LIMIT = 10
+    AUTOCOMPLETE_REFRESH = 300
+    USER_CACHE_SIZE = 10000
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 30)
+    MEMBERSHIP_CACHE_SIZE = 10000
+    MEMBERSHIP_CACHE_TTL = int(os.environ.get('MEMBERSHIP_CACHE_TTL') or 30)
+    IMAGE_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+    STATIC_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+    IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+    IMAGE_JPEG_QUALITY = 85
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH') or 16 * 1024 * 1024)
+    UPLOAD_LIMITS = {
+        'image/jpeg': 10 * 1024 * 1024,
+        'image/png': 10 * 1024 * 1024,
+        'image/webp': 10 * 1024 * 1024,
+        'image/gif': 4 * 1024 * 1024,
+        'image/bmp': 4 * 1024 * 1024,
+    }
+    JOB_BACKEND = os.environ.get('JOB_BACKEND') or 'thread'
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 2)
+    JOB_MAX_ATTEMPTS = 5
+    JOB_RETRY_DELAY = 2
+    JOB_POLL_INTERVAL = 1
+    BLOB_STORE = os.environ.get('BLOB_STORE') or 'filesystem'
+    BLOB_STORE_PATH = os.environ.get('BLOB_STORE_PATH') or os.path.join(basedir, 'blobs')
+    REALTIME_BROKER = os.environ.get('REALTIME_BROKER') or 'inprocess'
+    REALTIME_POLL_INTERVAL = 1
+    REALTIME_KEEPALIVE = 15
+    REALTIME_RETRY_MS = 3000
+    LAST_SEEN_THRESHOLD = int(os.environ.get('LAST_SEEN_THRESHOLD') or 60)
+    LAST_SEEN_FLUSH_INTERVAL = int(os.environ.get('LAST_SEEN_FLUSH_INTERVAL') or 30)
+    FRAGMENT_CACHE = os.environ.get('FRAGMENT_CACHE') or 'memory'
+    FRAGMENT_CACHE_SIZE = 2000
+    FRAGMENT_CACHE_PATH = os.environ.get('FRAGMENT_CACHE_PATH') or os.path.join(basedir, 'fragments')
+    QUERY_BUDGET = int(os.environ['QUERY_BUDGET']) if os.environ.get('QUERY_BUDGET') else None
+    PROFILING = os.environ.get('PROFILING', '').lower() in ('1', 'true', 'yes')
+    PROFILING_LOG = os.environ.get('PROFILING_LOG', '').lower() in ('1', 'true', 'yes')
+    PROFILING_SAMPLES = 1000
+    PROFILING_STATS_TOKEN = os.environ.get('PROFILING_STATS_TOKEN')
@@ -0,0 +1,118 @@
+"""blob store
+
+Revision ID: 3f9a6d2c8b15
+Revises: e17d05b9a3c2
+Create Date: 2026-10-18 16:21:08.904417
+
+"""
+import os
+import tempfile
+from hashlib import sha256
+
+from alembic import op
+import sqlalchemy as sa
+from flask import current_app
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a6d2c8b15'
+down_revision = 'e17d05b9a3c2'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('user', 'chat', 'news')
+
+
+def _owner_table(name):
+    return sa.table(name, sa.column('id', sa.Integer), sa.column('image', sa.LargeBinary),
+                    sa.column('image_hash', sa.String))
+
+
+# раскладка файлов хранилища на момент миграции: <BLOB_STORE_PATH>/ab/cd/abcd...
+def _blob_path(digest):
+    return os.path.join(current_app.config['BLOB_STORE_PATH'], digest[:2], digest[2:4], digest)
+
+
+def _put_blob(data):
+    digest = sha256(data).hexdigest()
+    path = _blob_path(digest)
+    if os.path.exists(path):
+        return digest
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return digest
+
+
+def _get_blob(digest):
+    try:
+        with open(_blob_path(digest), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+variant_table = sa.table('image_variant', sa.column('id', sa.Integer), sa.column('data', sa.LargeBinary),
+                         sa.column('digest', sa.String))
+
+
+def upgrade():
+    connection = op.get_bind()
+    op.add_column('image_variant', sa.Column('digest', sa.String(length=64), nullable=True))
+    ids = [row[0] for row in connection.execute(sa.select([variant_table.c.id]))]
+    for variant_id in ids:
+        data = connection.execute(sa.select([variant_table.c.data])
+                                  .where(variant_table.c.id == variant_id)).scalar()
+        connection.execute(variant_table.update().where(variant_table.c.id == variant_id)
+                           .values(digest=_put_blob(bytes(data))))
+    with op.batch_alter_table('image_variant') as batch_op:
+        batch_op.alter_column('digest', existing_type=sa.String(length=64), nullable=False)
+        batch_op.drop_column('data')
+
+    for name in TABLES:
+        table = _owner_table(name)
+        ids = [row[0] for row in connection.execute(sa.select([table.c.id]).where(table.c.image.isnot(None)))]
+        for owner_id in ids:
+            data = connection.execute(sa.select([table.c.image]).where(table.c.id == owner_id)).scalar()
+            connection.execute(table.update().where(table.c.id == owner_id)
+                               .values(image_hash=_put_blob(bytes(data))))
+        with op.batch_alter_table(name) as batch_op:
+            batch_op.drop_column('image')
+
+
+def downgrade():
+    connection = op.get_bind()
+    # столбец image_variant.data обязателен, поэтому без файлов откат невозможен:
+    # проверка идёт до любых изменений схемы
+    digests = {row[0] for row in connection.execute(sa.select([variant_table.c.digest]))}
+    missing = sorted(digest for digest in digests if not os.path.exists(_blob_path(digest)))
+    if missing:
+        raise RuntimeError('в хранилище {} нет файлов вариантов изображений: {}'.format(
+            current_app.config['BLOB_STORE_PATH'], ', '.join(missing)))
+
+    for name in TABLES:
+        op.add_column(name, sa.Column('image', sa.BLOB(), nullable=True))
+        table = _owner_table(name)
+        rows = connection.execute(sa.select([table.c.id, table.c.image_hash])
+                                  .where(table.c.image_hash.isnot(None))).fetchall()
+        for owner_id, image_hash in rows:
+            data = _get_blob(image_hash)
+            if data is not None:
+                connection.execute(table.update().where(table.c.id == owner_id).values(image=data))
+
+    op.add_column('image_variant', sa.Column('data', sa.BLOB(), nullable=True))
+    rows = connection.execute(sa.select([variant_table.c.id, variant_table.c.digest])).fetchall()
+    for variant_id, digest in rows:
+        connection.execute(variant_table.update().where(variant_table.c.id == variant_id)
+                           .values(data=_get_blob(digest)))
+    with op.batch_alter_table('image_variant') as batch_op:
+        batch_op.alter_column('data', existing_type=sa.BLOB(), nullable=False)
+        batch_op.drop_column('digest')
@@ -0,0 +1,45 @@
+"""search index
+
+Revision ID: 5b2e9d71c4f6
+Revises: d58b0c7e4a91
+Create Date: 2026-10-19 10:14:52.208741
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2e9d71c4f6'
+down_revision = 'd58b0c7e4a91'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('search_user', 'search_chat', 'search_news', 'search_post')
+
+
+def upgrade():
+    # таблицы FTS5 есть только в SQLite, в других бд поиск работает через LIKE
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS search_user USING fts5(username, about_me, "
+               "tokenize='unicode61 remove_diacritics 2')")
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS search_chat USING fts5(name, "
+               "tokenize='unicode61 remove_diacritics 2')")
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS search_news USING fts5(text, "
+               "tokenize='unicode61 remove_diacritics 2')")
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS search_post USING fts5(body, chat_id UNINDEXED, "
+               "tokenize='unicode61 remove_diacritics 2')")
+    op.execute("INSERT INTO search_user (rowid, username, about_me) "
+               "SELECT id, coalesce(username, ''), coalesce(about_me, '') FROM user")
+    op.execute("INSERT INTO search_chat (rowid, name) SELECT id, coalesce(name, '') FROM chat")
+    op.execute("INSERT INTO search_news (rowid, text) SELECT id, coalesce(text, '') FROM news")
+    op.execute("INSERT INTO search_post (rowid, body, chat_id) "
+               "SELECT id, coalesce(body, ''), chat_id FROM post WHERE chat_id IS NOT NULL")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table in TABLES:
+        op.execute('DROP TABLE IF EXISTS {}'.format(table))
@@ -0,0 +1,56 @@
+import itertools
+import os
+import tempfile
+
+import pytest
+
+# настройки читаются при импорте приложения, поэтому задаются до него
+_directory = tempfile.mkdtemp(prefix='trumpmateo-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_directory, 'app.db')
+os.environ['BLOB_STORE_PATH'] = os.path.join(_directory, 'blobs')
+os.environ['JOB_BACKEND'] = 'inline'
+os.environ['REALTIME_BROKER'] = 'inprocess'
+
+from app import app as flask_app, db, search  # noqa: E402
+
+_names = itertools.count(1)
+
+
+@pytest.fixture(scope='session')
+def app():
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with flask_app.app_context():
+        db.create_all()
+        if search.is_supported(db.session.connection()):
+            for statement in search.create_statements():
+                db.session.execute(statement)
+        db.session.commit()
+    yield flask_app
+    db.session.remove()
+
+
+@pytest.fixture
+def make_client(app):
+    """
+    фабрика клиентов: регистрирует нового пользователя и входит под ним
+    """
+    def make_client(name=None):
+        name = name or 'user{}'.format(next(_names))
+        client = app.test_client()
+        client.post('/register', data=dict(username=name, email=name + '@example.com',
+                                           password='secret', password2='secret'))
+        client.post('/login', data=dict(username=name, password='secret'))
+        client.username = name
+        return client
+    return make_client
+
+
+@pytest.fixture
+def create_chat():
+    """
+    создание группового чата с уникальным названием от имени клиента; возвращает id чата
+    """
+    def create_chat(client, name='chat'):
+        response = client.post('/index', data=dict(search_name='', create_name='{} {}'.format(name, next(_names))))
+        return int(response.headers['Location'].rsplit('/', 1)[1])
+    return create_chat
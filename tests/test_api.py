@@ -0,0 +1,27 @@
+def test_login_required(app):
+    assert app.test_client().get('/api/v1/chats').status_code == 401
+
+
+def test_etag_and_field_selection(make_client, create_chat):
+    client = make_client()
+    chat_id = create_chat(client, 'api room')
+    response = client.get('/api/v1/chats')
+    assert response.status_code == 200
+    assert client.get('/api/v1/chats', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+    items = client.get('/api/v1/chats?fields=id,unread').get_json()['items']
+    assert items == [{'id': chat_id, 'unread': 0}]
+    client.post('/message/{}'.format(chat_id), data=dict(text='changed'))
+    assert client.get('/api/v1/chats', headers={'If-None-Match': response.headers['ETag']}).status_code == 200
+
+
+def test_message_cursors(make_client, create_chat):
+    client = make_client()
+    chat_id = create_chat(client)
+    for i in range(12):
+        client.post('/message/{}'.format(chat_id), data=dict(text='m{}'.format(i)))
+    page = client.get('/api/v1/chats/{}/messages?limit=5&fields=id,body'.format(chat_id)).get_json()
+    assert [item['body'] for item in page['items']] == ['m7', 'm8', 'm9', 'm10', 'm11']
+    assert page['newer'] is None
+    older = client.get('/api/v1/chats/{}/messages?limit=5&before={}'.format(chat_id, page['older'])).get_json()
+    assert [item['body'] for item in older['items']] == ['m2', 'm3', 'm4', 'm5', 'm6']
+    assert make_client().get('/api/v1/chats/{}/messages'.format(chat_id)).status_code == 404
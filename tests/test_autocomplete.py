@@ -0,0 +1,31 @@
+from app import autocomplete, db
+from app.models import User
+
+
+def test_friends_come_first(make_client):
+    client = make_client('complete_me')
+    make_client('complete_a')
+    friend = make_client('complete_z')
+    client.get('/follow/' + friend.username)
+    found = [item['username'] for item in client.get('/autocomplete/users?q=COMPLETE_').get_json()]
+    assert found == ['complete_z', 'complete_a']
+
+
+def test_renamed_user_is_found_by_new_name(make_client):
+    client = make_client('rename_before')
+    client.get('/autocomplete/users?q=rename')
+    client.post('/edit_profile', data=dict(username='rename_after', about_me=''))
+    found = [username for user_id, username in autocomplete.index.complete('rename_', 10)]
+    assert found == ['rename_after']
+
+
+def test_reload_sees_renames_from_other_processes(make_client):
+    client = make_client('elsewhere_before')
+    client.get('/autocomplete/users?q=elsewhere')
+    db.session.execute(User.__table__.update().where(User.username == 'elsewhere_before')
+                       .values(username='elsewhere_after'))
+    db.session.commit()
+    assert autocomplete.index.complete('elsewhere_', 10)[0][1] == 'elsewhere_before'
+    autocomplete.index._load()
+    found = [username for user_id, username in autocomplete.index.complete('elsewhere_', 10)]
+    assert found == ['elsewhere_after']
@@ -0,0 +1,19 @@
+from app import queries
+from app.models import Chat
+
+
+def test_chat_history_pages_by_cursor(make_client, create_chat):
+    client = make_client()
+    chat_id = create_chat(client)
+    for i in range(40):
+        client.post('/message/{}'.format(chat_id), data=dict(text='m{:02d}'.format(i)))
+    chat = Chat.query.get(chat_id)
+    posts, has_older, has_newer = queries.chat_history(chat, limit=15)
+    assert [post.body for post in posts] == ['m{:02d}'.format(i) for i in range(25, 40)]
+    assert has_older and not has_newer
+    older, has_older, has_newer = queries.chat_history(chat, before=posts[0].id, limit=15)
+    assert [post.body for post in older] == ['m{:02d}'.format(i) for i in range(10, 25)]
+    assert has_older and has_newer
+    newer, has_older, has_newer = queries.chat_history(chat, after=older[-1].id, limit=15)
+    assert [post.id for post in newer] == [post.id for post in posts]
+    assert not has_newer
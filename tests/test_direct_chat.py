@@ -0,0 +1,16 @@
+import io
+
+from app.models import DirectChat, Invitation, User
+
+
+def test_direct_chat_stays_a_pair(make_client):
+    first, second, third = make_client(), make_client(), make_client()
+    first.get('/write_message/' + second.username)
+    low, high = DirectChat.key(*User.query.filter(User.username.in_([first.username, second.username])))
+    chat_id = DirectChat.query.filter_by(user_low_id=low, user_high_id=high).one().chat_id
+    response = first.post('/invite_user/{}'.format(chat_id), data=dict(username=third.username))
+    assert response.status_code == 403
+    assert Invitation.query.filter_by(chat_id=chat_id).count() == 0
+    response = first.post('/upload_chat_image/{}'.format(chat_id),
+                          data=dict(file=(io.BytesIO(b'not an image'), 'image.png')))
+    assert response.status_code == 403
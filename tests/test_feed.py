@@ -0,0 +1,32 @@
+from app import db, feed
+from app.models import FeedItem, News, User
+
+
+def user_id(name):
+    return db.session.query(User.id).filter_by(username=name).scalar()
+
+
+def test_news_is_fanned_out_to_friends(make_client):
+    author, friend, stranger = make_client(), make_client(), make_client()
+    friend.get('/follow/' + author.username)
+    author.post('/create_news', data=dict(text='fresh news'))
+    assert b'fresh news' in friend.get('/news').data
+    assert b'fresh news' not in stranger.get('/news').data
+
+
+def test_fan_out_is_idempotent(make_client):
+    author, friend = make_client(), make_client()
+    friend.get('/follow/' + author.username)
+    author.post('/create_news', data=dict(text='only once'))
+    news = News.query.filter_by(user_id=user_id(author.username)).one()
+    feed.fan_out(news)
+    db.session.commit()
+    assert FeedItem.query.filter_by(news_id=news.id).count() == 1
+
+
+def test_unfollow_removes_author_from_feed(make_client):
+    author, friend = make_client(), make_client()
+    friend.get('/follow/' + author.username)
+    author.post('/create_news', data=dict(text='soon gone'))
+    friend.get('/unfollow/' + author.username)
+    assert b'soon gone' not in friend.get('/news').data
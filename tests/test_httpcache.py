@@ -0,0 +1,17 @@
+from app import httpcache
+
+
+def test_fingerprinted_static_file_is_immutable(app):
+    client = app.test_client()
+    version = httpcache.fingerprint('common.css')
+    response = client.get('/static/common.css?v=' + version)
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'max-age={}'.format(app.config['STATIC_CACHE_MAX_AGE']) in response.headers['Cache-Control']
+
+
+def test_stale_fingerprint_is_revalidated(app):
+    client = app.test_client()
+    response = client.get('/static/common.css?v=0123456789ab')
+    assert response.status_code == 200
+    assert 'immutable' not in response.headers['Cache-Control']
+    assert 'no-cache' in response.headers['Cache-Control']
@@ -0,0 +1,34 @@
+from app import db, invitations, membership
+from app.models import Chat, Invitation, User
+
+
+def test_batch_invitations(make_client, create_chat):
+    owner, first, second, third = make_client(), make_client(), make_client(), make_client()
+    chat_ids = [create_chat(owner) for i in range(3)]
+    for chat_id in chat_ids:
+        owner.post('/invite_user/{}'.format(chat_id),
+                   data=dict(username='{}, {}, nobody'.format(first.username, second.username)))
+    chat = Chat.query.get(chat_ids[0])
+    result = invitations.invite(chat, [first.username, third.username])
+    db.session.commit()
+    assert result.invited == [third.username] and result.skipped == [first.username]
+
+    user = User.query.filter_by(username=first.username).one()
+    ids = [invitation.id for invitation in invitations.pending(user)]
+    assert len(ids) == 3
+    first.post('/invitations', data=dict(invitation_id=ids[:2], accept='1'))
+    first.post('/invitations', data=dict(invitation_id=ids[2:], decline='1'))
+    user = User.query.filter_by(username=first.username).one()
+    assert Invitation.query.filter_by(user_id=user.id).count() == 0
+    assert [membership.is_member(user, chat_id) for chat_id in chat_ids] == [True, True, False]
+
+
+def test_invitations_of_other_users_are_ignored(make_client, create_chat):
+    owner, invited, intruder = make_client(), make_client(), make_client()
+    chat_id = create_chat(owner)
+    owner.post('/invite_user/{}'.format(chat_id), data=dict(username=invited.username))
+    invitation_id = Invitation.query.filter_by(chat_id=chat_id).one().id
+    intruder.post('/invitations', data=dict(invitation_id=[invitation_id], accept='1'))
+    assert intruder.get('/accept_the_invitation/{}'.format(invitation_id)).status_code == 404
+    assert intruder.get('/chat/{}'.format(chat_id)).status_code == 403
+    assert Invitation.query.filter_by(chat_id=chat_id).count() == 1
@@ -0,0 +1,34 @@
+import pytest
+
+from app import profiling
+
+
+@pytest.fixture
+def profiled(app):
+    app.config.update(PROFILING=True, PROFILING_STATS_TOKEN='stats-token')
+    profiling.stats.reset()
+    yield app
+    app.config.update(PROFILING=False, PROFILING_STATS_TOKEN=None)
+
+
+def test_pages_are_timed(profiled, make_client):
+    client = make_client()
+    for i in range(2):
+        response = client.get('/news')
+        assert 'Server-Timing' in response.headers
+    summary = client.get('/_stats', headers={'X-Stats-Token': 'stats-token'}).get_json()
+    assert summary['news']['requests'] == 2
+    assert summary['news']['queries_avg'] >= 1
+
+
+def test_stats_require_token(profiled, make_client):
+    client = make_client()
+    assert client.get('/_stats').status_code == 404
+    assert client.get('/_stats', headers={'X-Stats-Token': 'wrong'}).status_code == 404
+    # адрес клиента не заменяет токен: за локальным прокси все запросы приходят с 127.0.0.1
+    assert client.get('/_stats', environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code == 404
+
+
+def test_stats_hidden_without_profiling(app, make_client):
+    client = make_client()
+    assert client.get('/_stats', headers={'X-Stats-Token': 'anything'}).status_code == 404
@@ -0,0 +1,90 @@
+"""
+Основные страницы и ответы API не должны выходить за бюджет sql-запросов:
+при app.testing превышение QUERY_BUDGET завершает запрос ошибкой
+QueryBudgetExceeded, а число запросов отдаётся в заголовке X-Query-Count.
+"""
+
+import pytest
+
+from app import db
+from app.models import News, Post, User
+from app.profiling import QueryBudgetExceeded
+
+QUERY_BUDGET = 8
+
+
+@pytest.fixture
+def budget(app):
+    app.config['QUERY_BUDGET'] = QUERY_BUDGET
+    yield QUERY_BUDGET
+    app.config['QUERY_BUDGET'] = None
+
+
+@pytest.fixture
+def pages(make_client, create_chat):
+    reader, author = make_client(), make_client()
+    reader.get('/follow/' + author.username)
+    author.get('/follow/' + reader.username)
+    for i in range(5):
+        author.post('/create_news', data=dict(text='news {}'.format(i)))
+    commenters = [make_client() for i in range(3)]
+    news_ids = [news_id for news_id, in db.session.query(News.id)
+                .join(User, User.id == News.user_id).filter(User.username == author.username)]
+    for news_id in news_ids:
+        for commenter in commenters:
+            commenter.post('/comment/{}/{}'.format(author.username, news_id), data=dict(comment='nice'))
+    chat_id = create_chat(author, 'budget room')
+    author.post('/invite_user/{}'.format(chat_id), data=dict(username=reader.username))
+    for i in range(30):
+        author.post('/message/{}'.format(chat_id), data=dict(text='message {}'.format(i)))
+    author.get('/write_message/' + reader.username)
+    db.session.remove()
+    return reader, author, chat_id
+
+
+def page_urls(author, chat_id):
+    return [
+        '/index',
+        '/news',
+        '/user/' + author.username,
+        '/list_of_friends',
+        '/chat/{}'.format(chat_id),
+        '/search?q=news',
+        '/autocomplete/users?q=user',
+        '/api/v1/chats',
+        '/api/v1/chats/{}/messages'.format(chat_id),
+        '/api/v1/feed',
+        '/api/v1/users/' + author.username,
+        '/api/v1/friends',
+    ]
+
+
+def test_pages_stay_within_budget(pages, budget):
+    reader, author, chat_id = pages
+    for url in page_urls(author, chat_id):
+        response = author.get(url)
+        assert response.status_code == 200, url
+        assert int(response.headers['X-Query-Count']) <= budget, url
+
+
+def test_exceeded_budget_fails(app, pages):
+    reader, author, chat_id = pages
+    app.config['QUERY_BUDGET'] = 0
+    try:
+        with pytest.raises(QueryBudgetExceeded):
+            author.get('/news')
+    finally:
+        app.config['QUERY_BUDGET'] = None
+
+
+def test_budget_does_not_grow_with_comments(pages, budget):
+    reader, author, chat_id = pages
+    before = int(author.get('/user/' + author.username).headers['X-Query-Count'])
+    news = News.query.join(User, User.id == News.user_id).filter(User.username == author.username).first()
+    commenter = User.query.filter(User.username != author.username).first()
+    for i in range(10):
+        db.session.add(Post(body='more', author=commenter, news=news, timestamp=news.timestamp))
+    news.bump_version()
+    db.session.commit()
+    after = int(author.get('/user/' + author.username).headers['X-Query-Count'])
+    assert after <= before
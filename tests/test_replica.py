@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from app import db, replica
+from app.models import Invitation
+
+
+@pytest.fixture
+def replica_db(app):
+    path = os.path.join(os.path.dirname(db.engine.url.database), 'replica.db')
+    binds = app.config['SQLALCHEMY_BINDS']
+    app.config['SQLALCHEMY_BINDS'] = {'replica': 'sqlite:///' + path}
+    yield replica
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def pinned(client):
+    with client.session_transaction() as session:
+        return 'db_primary_until' in session
+
+
+def unpin(client):
+    with client.session_transaction() as session:
+        session.pop('db_primary_until', None)
+
+
+def test_viewing_read_chat_keeps_session_unpinned(replica_db, make_client, create_chat):
+    client = make_client()
+    chat_id = create_chat(client)
+    replica_db.sync()
+    unpin(client)
+    assert client.get('/chat/{}'.format(chat_id)).status_code == 200
+    assert not pinned(client)
+    assert client.get('/news').status_code == 200
+    assert not pinned(client)
+
+
+def test_reading_unread_messages_pins_session(replica_db, make_client, create_chat):
+    owner, member = make_client(), make_client()
+    chat_id = create_chat(owner)
+    owner.post('/invite_user/{}'.format(chat_id), data=dict(username=member.username))
+    invitation_id = Invitation.query.filter_by(chat_id=chat_id).one().id
+    member.get('/accept_the_invitation/{}'.format(invitation_id))
+    owner.post('/message/{}'.format(chat_id), data=dict(text='new'))
+    replica_db.sync()
+    unpin(member)
+    assert member.get('/chat/{}'.format(chat_id)).status_code == 200
+    assert pinned(member)
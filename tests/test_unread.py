@@ -0,0 +1,39 @@
+from sqlalchemy import event
+
+from app import db
+
+
+def unread(chat_id, username):
+    return db.session.execute(
+        'SELECT unread FROM user_chats JOIN user ON user.id = user_chats.user_id '
+        'WHERE chat_id = :chat_id AND username = :username', dict(chat_id=chat_id, username=username)).scalar()
+
+
+def test_unread_counter_is_reset_on_view(make_client, create_chat):
+    owner, member = make_client(), make_client()
+    chat_id = create_chat(owner)
+    owner.post('/invite_user/{}'.format(chat_id), data=dict(username=member.username))
+    member.get('/accept_the_invitation/{}'.format(
+        db.session.execute('SELECT id FROM invitation WHERE chat_id = :chat_id', dict(chat_id=chat_id)).scalar()))
+    for i in range(3):
+        owner.post('/message/{}'.format(chat_id), data=dict(text='m{}'.format(i)))
+    assert unread(chat_id, member.username) == 3
+    member.get('/chat/{}'.format(chat_id))
+    assert unread(chat_id, member.username) == 0
+
+
+def test_viewing_read_chat_does_not_write(app, make_client, create_chat):
+    client = make_client()
+    chat_id = create_chat(client)
+    client.get('/chat/{}'.format(chat_id))
+    statements = []
+
+    def remember(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', remember)
+    try:
+        assert client.get('/chat/{}'.format(chat_id)).status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', remember)
+    assert not [statement for statement in statements
+                if statement.lstrip().upper().startswith(('UPDATE', 'INSERT', 'DELETE'))]
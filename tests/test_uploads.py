@@ -0,0 +1,40 @@
+import io
+
+import pytest
+
+from app import errors
+
+
+@pytest.fixture
+def small_requests(app):
+    limit = app.config['MAX_CONTENT_LENGTH']
+    app.config['MAX_CONTENT_LENGTH'] = 1024
+    yield
+    app.config['MAX_CONTENT_LENGTH'] = limit
+
+
+def upload(client, **headers):
+    return client.post('/upload', data=dict(file=(io.BytesIO(b'x' * 4096), 'big.png')), headers=headers)
+
+
+def test_too_large_form_upload_redirects(make_client, small_requests):
+    response = upload(make_client(), Referer='http://localhost/edit_profile')
+    assert response.status_code == 302
+    assert response.headers['Location'] == 'http://localhost/edit_profile'
+
+
+@pytest.mark.parametrize('headers', [
+    {'X-Requested-With': 'XMLHttpRequest'},
+    {'Accept': 'application/json'},
+])
+def test_too_large_script_upload_gets_json(make_client, small_requests, headers):
+    response = upload(make_client(), **headers)
+    assert response.status_code == 413
+    assert 'error' in response.get_json()
+
+
+def test_too_large_api_request_gets_json(app):
+    with app.test_request_context('/api/v1/chats', method='POST'):
+        response, code = errors.too_large_error(None)
+    assert code == 413
+    assert 'error' in response.get_json()